@@ -0,0 +1,2 @@
+''' Offline benchmarks: a synthetic site served by a fake cache server, crawled
+end to end, plus micro benchmarks of the hot paths. Run `python -m benchmark`. '''
@@ -0,0 +1,74 @@
+import sys
+import json
+
+from argparse import ArgumentParser
+import benchmark
+from benchmark.scenarios import SCENARIOS, run_scenario
+
+
+def _print(name, result, indent=""):
+    print(f"{indent}{name}:")
+    for key, value in result.items():
+        if isinstance(value, dict):
+            _print(key, value, indent + "  ")
+        elif isinstance(value, float):
+            print(f"{indent}  {key}: {value:.3f}")
+        else:
+            print(f"{indent}  {key}: {value}")
+
+def regressions(results, baseline, tolerance):
+    ''' Throughput figures (keys ending in per_second) that fell more than
+    tolerance below the same figure in baseline. '''
+    found = list()
+    for name, result in results.items():
+        for key, value in result.items():
+            previous = baseline.get(name, {}).get(key)
+            if key.endswith("per_second") and previous and value < previous * (1 - tolerance):
+                found.append(f"{name}.{key}: {value:.1f} (was {previous:.1f})")
+    return found
+
+def main():
+    parser = ArgumentParser(prog="python -m benchmark", description=benchmark.__doc__)
+    parser.add_argument("scenarios", nargs="*", default=[],
+                        help=f"scenarios to run (default: all): {', '.join(SCENARIOS)}")
+    parser.add_argument("--pages", type=int, default=1000, help="pages in the synthetic site")
+    parser.add_argument("--hosts", type=int, default=50, help="hosts the pages are spread over")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=8, help="THREADCOUNT for the crawls")
+    parser.add_argument("--processes", type=int, default=2, help="PARSERPROCESSES for crawl_parser_processes")
+    parser.add_argument("--shards", type=int, default=2, help="SHARDS for crawl_shards")
+    parser.add_argument("--budget", type=int, default=500, help="downloads crawl_budget stops after")
+    parser.add_argument("--changes", type=float, default=0.1, help="share of pages that change before crawl_recrawl's recrawl")
+    parser.add_argument("--politeness", type=float, default=0.0, help="POLITENESS for the crawls")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the fake cache server waits per request")
+    parser.add_argument("--urls", type=int, default=20000, help="urls added in frontier_add")
+    parser.add_argument("--output", type=str, default=None, help="write the results as json")
+    parser.add_argument("--baseline", type=str, default=None,
+                        help="results of an earlier --output; exit with 1 on a throughput regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed throughput drop against --baseline")
+    parser.add_argument("--keep", action="store_true", default=False, help="keep the scenarios' working directories")
+    args = parser.parse_args()
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    options = vars(args)
+    results = dict()
+    for name in args.scenarios or SCENARIOS:
+        results[name] = run_scenario(name, options)
+        _print(name, results[name])
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=1)
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            found = regressions(results, json.load(baseline), args.tolerance)
+        for regression in found:
+            print(f"REGRESSION {regression}")
+        if found:
+            sys.exit(1)
+    if any("error" in result for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+import os
+import json
+import time
+import shelve
+import shutil
+import logging
+import resource
+import tempfile
+
+from configparser import ConfigParser
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import get_context
+from queue import Empty
+
+from benchmark.site import SyntheticSite
+from benchmark.server import FakeCacheServer
+
+# config.ini of the crawler; scenarios start from it and override what they need.
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.ini")
+
+
+def make_config(options, overrides=None):
+    ''' Config built from config.ini with "SECTION.KEY": value overrides. '''
+    from utils.config import Config
+    cparser = ConfigParser()
+    cparser.read(CONFIG_FILE)
+    settings = {
+        "IDENTIFICATION.USERAGENT": "benchmark",
+        "CRAWLER.POLITENESS": options["politeness"],
+        "LOCAL PROPERTIES.THREADCOUNT": options["threads"],
+        "METRICS.ENABLED": True,
+        "METRICS.INTERVAL": 3600}
+    settings.update(overrides or {})
+    for name, value in settings.items():
+        section, key = name.split(".", 1)
+        if not cparser.has_section(section):
+            cparser.add_section(section)
+        cparser[section][key] = str(value)
+    return Config(cparser)
+
+def make_site(options, version=0):
+    return SyntheticSite(pages=options["pages"], hosts=options["hosts"], seed=options["seed"], version=version)
+
+def _rss():
+    # Resident set size in bytes (Linux), or 0 where /proc is not available.
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+def _disk_usage(directory):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(directory) for name in names)
+
+def _in_workdir(options, function):
+    # Runs function() inside a fresh temporary directory, so every save file starts empty.
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="benchmark-")
+    os.chdir(workdir)
+    try:
+        return function(workdir)
+    finally:
+        os.chdir(cwd)
+        if options["keep"]:
+            print(f"Kept {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _close_frontier(frontier):
+    # dbm.dumb keeps relative paths and writes its index when closed, so the
+    # frontier is closed before the scenario leaves its working directory.
+    # Crawler.join closes the scraper's stores.
+    frontier.journal.close()
+    frontier.save.close()
+
+def _stored_pages(config):
+    from utils.page_store import PageStore
+    store = PageStore(config.page_store)
+    try:
+        return len(store)
+    finally:
+        store.close()
+
+def _budgeted(frontier_class, budget):
+    # The frontier hands out at most budget urls, then ends the crawl.
+    class BudgetedFrontier(frontier_class):
+        def __init__(self, config, restart):
+            self.handed_out = 0
+            super().__init__(config, restart)
+
+        def get_tbd_url(self):
+            with self.lock:
+                if self.handed_out >= budget:
+                    return None
+                self.handed_out += 1
+            return super().get_tbd_url()
+    return BudgetedFrontier
+
+def crawl(options, engine="threads", overrides=None, budget=None):
+    ''' Crawls the synthetic site end to end through Crawler, stopping after
+    budget downloads if one is given. '''
+    from crawler import Crawler, FRONTIERS
+    import scraper
+    site = make_site(options)
+    server = FakeCacheServer(site, latency=options["latency"]).start()
+    logging.disable(logging.INFO) # One log line per url would dominate the timings.
+
+    def run(workdir):
+        config = make_config(options, {"CRAWLER.SEEDURL": ",".join(site.seed_urls), **(overrides or {})})
+        config.engine = engine
+        config.cache_server = server.address
+        rss_before = _rss()
+        start = time.time()
+        frontier_factory = _budgeted(FRONTIERS[config.frontier], budget) if budget else None
+        crawler = Crawler(config, True, frontier_factory=frontier_factory)
+        scraper.robots_cache.fetch = site.robots # No robots.txt requests leave the machine.
+        crawler.start()
+        elapsed = time.time() - start
+        with open(config.metrics_file) as snapshot_file:
+            snapshot = json.load(snapshot_file)
+        counters = snapshot["counters"]
+        stored, discovered = _stored_pages(config), len(crawler.frontier.journal)
+        _close_frontier(crawler.frontier)
+        return {
+            "pages_per_second": counters.get("pages", 0) / elapsed,
+            "elapsed": elapsed,
+            "downloaded": counters.get("pages", 0),
+            "stored": stored,
+            "urls_discovered": discovered,
+            "stages": {
+                stage: {"p50_ms": timer["p50"] * 1000, "p99_ms": timer["p99"] * 1000, "count": timer["count"]}
+                for stage, timer in sorted(snapshot["stages"].items())},
+            "rejected": {name: count for name, count in sorted(counters.items()) if name.startswith("rejected")},
+            "rss_growth_mb": (_rss() - rss_before) / 2 ** 20,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10,
+            "disk_mb": _disk_usage(workdir) / 2 ** 20}
+    try:
+        return _in_workdir(options, run)
+    finally:
+        server.close()
+
+def crawl_threads(options):
+    return crawl(options, "threads")
+
+def crawl_asyncio(options):
+    return crawl(options, "asyncio")
+
+def crawl_parser_processes(options):
+    return crawl(options, "threads", {
+        "CRAWLER.EXTRACTOR": "fast", "LOCAL PROPERTIES.PARSERPROCESSES": options["processes"]})
+def crawl_recrawl(options):
+    ''' A full crawl, then a --recrawl of the same pages after --changes of
+    them changed. Pages are downloaded again either way (the cache server has
+    no conditional requests); unchanged ones skip parsing and storage. '''
+    from crawler import Crawler
+    import scraper
+    logging.disable(logging.INFO)
+
+    def crawl_version(version, recrawl):
+        site = make_site(options, version)
+        site.changes = options["changes"]
+        server = FakeCacheServer(site, latency=options["latency"]).start()
+        try:
+            config = make_config(options, {"CRAWLER.SEEDURL": ",".join(site.seed_urls), "RECRAWL.ENABLED": True, "RECRAWL.INITIALINTERVAL": 0})
+            config.cache_server = server.address
+            config.recrawl = recrawl
+            start = time.time()
+            crawler = Crawler(config, not recrawl)
+            scraper.robots_cache.fetch = site.robots
+            crawler.start()
+            elapsed = time.time() - start
+            with open(config.metrics_file) as snapshot_file:
+                snapshot = json.load(snapshot_file)
+            stored = _stored_pages(config)
+            _close_frontier(crawler.frontier)
+        finally:
+            server.close()
+        counters = snapshot["counters"]
+        return {
+            "elapsed": elapsed,
+            "downloaded": counters.get("pages", 0),
+            "parsed": snapshot["stages"].get("parse", {}).get("count", 0),
+            "unchanged": counters.get("rejected_page.unchanged", 0),
+            "stored": stored}
+
+    def run(workdir):
+        full = crawl_version(0, False)
+        refresh = crawl_version(1, True)
+        return {"full": full, "recrawl": refresh, "time_ratio": refresh["elapsed"] / full["elapsed"]}
+    return _in_workdir(options, run)
+
+def crawl_budget(options):
+    ''' Unique pages stored per 1000 downloads when the crawl stops after
+    --budget downloads, for each FRONTIER. '''
+    result = dict()
+    for frontier in ("lifo", "priority"):
+        crawled = crawl(options, "threads", {"CRAWLER.FRONTIER": frontier}, budget=options["budget"])
+        result[frontier] = {
+            "stored_per_1k_downloads": 1000 * crawled["stored"] / crawled["downloaded"],
+            "stored": crawled["stored"],
+            "downloaded": crawled["downloaded"],
+            "pages_per_second": crawled["pages_per_second"]}
+    return result
+
+def _run_shard(site, *args):
+    # run_shard with robots.txt taken from the site, as crawl() does.
+    from crawler.shard import run_shard
+    from utils.robots import RobotsCache
+    logging.disable(logging.INFO)
+    RobotsCache.fetch_lines = lambda cache, scheme, host: site.robots(scheme, host)
+    run_shard(*args)
+
+def crawl_shards(options):
+    ''' Crawls the synthetic site with --shards processes of --threads
+    threads each, one fake cache server per shard. '''
+    from crawler.shard import run_shards, shard_directory
+    site = make_site(options)
+    shards = options["shards"]
+    servers = [FakeCacheServer(site, latency=options["latency"]).start() for _ in range(shards)]
+    logging.disable(logging.INFO)
+
+    def run(workdir):
+        config = make_config(options, {
+            "CRAWLER.SEEDURL": ",".join(site.seed_urls), "LOCAL PROPERTIES.SHARDS": shards})
+        config.cache_server = tuple(server.address for server in servers)
+        start = time.time()
+        if not run_shards(config, True, target=partial(_run_shard, site)):
+            raise RuntimeError("a shard failed")
+        elapsed = time.time() - start
+        counters = list()
+        for shard in range(shards):
+            with open(os.path.join(shard_directory(shard), config.metrics_file)) as snapshot_file:
+                counters.append(json.load(snapshot_file)["counters"])
+        downloaded = sum(counter.get("pages", 0) for counter in counters)
+        return {
+            "pages_per_second": downloaded / elapsed,
+            "elapsed": elapsed,
+            "downloaded": downloaded,
+            "shard_downloaded": [counter.get("pages", 0) for counter in counters],
+            "forwarded": sum(counter.get("shard_forwarded", 0) for counter in counters),
+            "disk_mb": _disk_usage(workdir) / 2 ** 20}
+    try:
+        return _in_workdir(options, run)
+    finally:
+        for server in servers:
+            server.close()
+
+
+def _sample_pages(options, count):
+    site = make_site(options)
+    pages = list()
+    for number in range(options["pages"]):
+        status, content = site.page(site.url(number))
+        if content is not None and len(content) > 8000:
+            pages.append((content, site.url(number)))
+        if len(pages) == count:
+            break
+    return pages
+
+def extractor(options):
+    ''' Time to parse one page with the BeautifulSoup and the lxml extractors,
+    and to compute its MinHash signature on top. '''
+    from scraper import parse_page
+    from utils.near_duplicates import minhash_signature
+    pages = _sample_pages(options, 200)
+    slots = make_config(options).minhash_slots
+    result = dict()
+    for name in ("soup", "fast"):
+        start = time.perf_counter()
+        for content, url in pages:
+            parse_page(content, url, name)
+        result[f"{name}_ms_per_page"] = (time.perf_counter() - start) * 1000 / len(pages)
+    result["speedup"] = result["soup_ms_per_page"] / result["fast_ms_per_page"]
+    start = time.perf_counter()
+    for content, url in pages:
+        minhash_signature(parse_page(content, url, "fast").token_frequency.keys(), slots)
+    result["fast_with_signature_ms_per_page"] = (time.perf_counter() - start) * 1000 / len(pages)
+    return result
+
+def parser_processes(options):
+    ''' Pages parsed per second in the calling process and in pools of 1, 2
+    and 4 processes. '''
+    from scraper import parse_page
+    pages = _sample_pages(options, 200)
+    contents = [content for content, _ in pages]
+    urls = [url for _, url in pages]
+    arguments = (contents, urls, ["fast"] * len(pages))
+    result = dict()
+    start = time.perf_counter()
+    list(map(parse_page, *arguments))
+    result["inline_pages_per_second"] = len(pages) / (time.perf_counter() - start)
+    for processes in (1, 2, 4):
+        with ProcessPoolExecutor(max_workers=processes, mp_context=get_context("spawn")) as pool:
+            list(pool.map(parse_page, contents[:processes], urls[:processes])) # Start the processes first.
+            start = time.perf_counter()
+            list(pool.map(parse_page, *arguments, chunksize=4))
+            result[f"{processes}_processes_pages_per_second"] = len(pages) / (time.perf_counter() - start)
+    return result
+
+def _shelve_add_url(save, url):
+    # Frontier.add_url before the journal: one shelve write and sync per new url.
+    from utils import get_urlhash, normalize
+    url = normalize(url)
+    urlhash = get_urlhash(url)
+    if urlhash not in save:
+        save[urlhash] = (url, False)
+        save.sync()
+
+def frontier_add(options):
+    ''' add_url throughput of the journaled frontier against a plain shelve.
+    The shelve syncs on every new url, so it only gets the first 1000. '''
+    from crawler.frontier import Frontier
+    logging.disable(logging.INFO)
+    count = options["urls"]
+    urls = [f"https://h{number % 500}.ics.uci.edu/p{number}" for number in range(count)]
+
+    def run(workdir):
+        result = dict()
+        save = shelve.open("plain.shelve")
+        for label in ("new", "repeated"):
+            start = time.perf_counter()
+            for url in urls[:1000]:
+                _shelve_add_url(save, url)
+            result[f"shelve_{label}_urls_per_second"] = min(count, 1000) / (time.perf_counter() - start)
+        save.close()
+        frontier = Frontier(make_config(options, {"CRAWLER.SEEDURL": urls[0]}), True)
+        for label in ("new", "repeated"):
+            start = time.perf_counter()
+            for url in urls:
+                frontier.add_url(url)
+            result[f"frontier_{label}_urls_per_second"] = count / (time.perf_counter() - start)
+        _close_frontier(frontier)
+        return result
+    return _in_workdir(options, run)
+
+
+# name -> scenario, in the order `python -m benchmark` runs them.
+SCENARIOS = {
+    "crawl_threads": crawl_threads,
+    "crawl_asyncio": crawl_asyncio,
+    "crawl_parser_processes": crawl_parser_processes,
+    "crawl_shards": crawl_shards,
+    "crawl_budget": crawl_budget,
+    "crawl_recrawl": crawl_recrawl,
+    "extractor": extractor,
+    "parser_processes": parser_processes,
+    "frontier_add": frontier_add,
+}
+
+
+def _run(name, options, results):
+    # Runs in a process of its own: the crawler keeps module-level state.
+    try:
+        results.put((name, SCENARIOS[name](options)))
+    except Exception as err:
+        results.put((name, {"error": f"{type(err).__name__}: {err}"}))
+        raise
+
+def run_scenario(name, options):
+    context = get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_run, args=(name, options, results))
+    process.start()
+    try:
+        while True:
+            try:
+                return results.get(timeout=1)[1]
+            except Empty:
+                if not process.is_alive():
+                    return {"error": f"scenario process exited with code {process.exitcode}"}
+    finally:
+        process.join()
@@ -0,0 +1,106 @@
+import time
+import zlib
+import pickle
+
+import cbor
+import requests
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from multiprocessing import get_context
+from urllib.parse import urlparse, parse_qs
+
+
+class FakeCacheServer(object):
+    ''' Local stand-in for the spacetime cache server.
+
+    Answers GET /?q=<url>&u=<user agent> the way utils.download.download
+    expects: a CBOR map with the url, the status and, for pages, a pickled
+    requests.Response. Pages come from site.page(url). latency seconds are
+    slept before each answer to mimic the network. A `failures` fraction of
+    the urls (picked by their crc32) are answered 503 the first time they are
+    asked for, so downloads have to retry them. The server runs in a process
+    of its own, so generating pages does not compete with the crawler being
+    measured for the GIL. connections, requests and errors count the
+    connections accepted, the requests answered and the 503s sent. '''
+
+    def __init__(self, site, latency=0.0, failures=0.0):
+        self.site = site
+        self.latency = latency
+        self.failures = failures
+        self.address = None
+        self.process = None
+        self.connections = self.requests = self.errors = None
+
+    def start(self):
+        context = get_context("spawn")
+        addresses = context.Queue()
+        self.connections, self.requests, self.errors = (context.Value("q", 0) for _ in range(3))
+        counters = (self.connections, self.requests, self.errors)
+        self.process = context.Process(
+            target=_serve, args=(self.site, self.latency, self.failures, counters, addresses), daemon=True)
+        self.process.start()
+        self.address = addresses.get()
+        return self
+
+    def close(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+            self.process = None
+
+
+def answer(site, url, latency=0.0):
+    ''' The CBOR-ready answer of the cache server for url. '''
+    if latency:
+        time.sleep(latency)
+    status, content = site.page(url)
+    if content is None:
+        return {"url": url, "status": status, "error": f"HTTP {status} for {url}"}
+    resp = requests.Response()
+    resp.status_code = status
+    resp.url = url
+    resp._content = content
+    resp.headers["Content-Type"] = "text/html; charset=utf-8"
+    resp.encoding = "utf-8"
+    return {"url": url, "status": status, "response": pickle.dumps(resp)}
+
+def _count(counter):
+    with counter.get_lock():
+        counter.value += 1
+
+def _serve(site, latency, failures, counters, addresses):
+    connections, requests, errors = counters
+    failed = set() # urls already answered 503 once
+
+    class CacheHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # Keep-alive, like the real server.
+
+        def setup(self):
+            super().setup()
+            _count(connections)
+
+        def do_GET(self):
+            _count(requests)
+            query = parse_qs(urlparse(self.path).query)
+            if "q" not in query or "u" not in query:
+                self.send_error(400)
+                return
+            url = query["q"][0]
+            if zlib.crc32(url.encode("utf-8")) % 1000 < failures * 1000 and url not in failed:
+                failed.add(url)
+                _count(errors)
+                self.send_error(503)
+                return
+            body = cbor.dumps(answer(site, url, latency))
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CacheHandler)
+    server.daemon_threads = True
+    addresses.put(server.server_address[:2])
+    server.serve_forever()
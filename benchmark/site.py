@@ -0,0 +1,143 @@
+import random
+
+from urllib.parse import urlparse
+
+
+class SyntheticSite(object):
+    ''' Deterministic web of `pages` pages spread over `hosts` *.ics.uci.edu hosts.
+
+    Nothing is stored: every page is generated from its url and the seed, so
+    the same site can be served to several crawls. Page n lives at
+    https://h<n % hosts>.ics.uci.edu/p<n> and links to `links` random pages.
+    A fraction of the pages are exact duplicates or near duplicates (a few
+    words changed) of an earlier page, return 404, or are too small to keep.
+    A fraction also link into traps:
+      /calendar/<day>   an endless chain of near-duplicate pages,
+      /p<n>?sid=<id>    the same page under endless session ids,
+      /a/b/a/b/...      repeating directories,
+      /private/...      paths disallowed by robots.txt.
+    A `shares` fraction of the pages also link to ?share= variants of
+    themselves, which serve the same page: a query explosion that only
+    duplicate detection after the fetch would otherwise catch. The first
+    `mirrors` fraction of the hosts mostly mirror the same 20 pages: 80% of
+    their pages are copies of one of those, so they yield little.
+    A site with a later `version` changes the text of a `changes` fraction of
+    its ordinary pages, for recrawls. '''
+
+    def __init__(self, pages=1000, hosts=20, links=8, duplicates=0.05, near_duplicates=0.05,
+                 traps=0.02, errors=0.02, shares=0.3, mirrors=0.2, version=0, changes=0.1, words=1500, vocabulary=5000, seed=1):
+        self.pages = pages
+        self.hosts = hosts
+        self.links = links
+        self.duplicates = duplicates
+        self.near_duplicates = near_duplicates
+        self.traps = traps
+        self.errors = errors
+        self.shares = shares
+        self.mirrors = mirrors
+        self.version = version
+        self.changes = changes
+        self.words = words
+        self.vocabulary = [f"word{i}" for i in range(vocabulary)]
+        self.seed = seed
+        self.max_trap_depth = 10000 # Keeps every trap finite even if the crawler never notices it.
+
+    @property
+    def seed_urls(self):
+        return [self.url(0)]
+
+    def url(self, number):
+        return f"https://h{number % self.hosts}.ics.uci.edu/p{number}"
+
+    def robots(self, scheme, host):
+        ''' robots.txt lines for host, in the shape RobotsCache's fetch returns. '''
+        return ["User-agent: *", "Disallow: /private"]
+
+    def _random(self, *key):
+        return random.Random(f"{self.seed}:{':'.join(map(str, key))}")
+
+    def _kind(self, number):
+        # Page 0 is the seed and always an ordinary page.
+        draw = self._random("kind", number).random() if number else 1.0
+        for kind, share in (("error", self.errors), ("duplicate", 0.8 if self._mirror(number) else self.duplicates),
+                            ("near duplicate", self.near_duplicates), ("small", self.errors)):
+            if draw < share:
+                return kind
+            draw -= share
+        return "page"
+
+    def _mirror(self, number):
+        return number % self.hosts < self.mirrors * self.hosts
+
+    def _text(self, number):
+        rand = self._random("text", number)
+        return [rand.choice(self.vocabulary) for _ in range(self.words)]
+
+    def _outlinks(self, number):
+        rand = self._random("links", number)
+        hrefs = [self.url(rand.randrange(self.pages)) for _ in range(self.links)]
+        # Relative links, fragments and off-site links exercise url handling.
+        same_host = number % self.hosts + self.hosts * rand.randrange(max(1, self.pages // self.hosts))
+        hrefs.append(f"/p{same_host if same_host < self.pages else number}#section")
+        hrefs.append("https://www.example.com/")
+        if rand.random() < self.traps:
+            trap = rand.choice(["calendar", "session", "repeating", "private"])
+            if trap == "calendar":
+                hrefs.append(f"/calendar/{rand.randrange(365)}")
+            elif trap == "session":
+                hrefs.append(f"/p{number}?sid={rand.randrange(1 << 30)}")
+            elif trap == "repeating":
+                hrefs.append("/a/b/a/b/index")
+            else:
+                hrefs.append(f"/private/p{number}")
+        if rand.random() < self.shares:
+            hrefs.extend(f"/p{number}?share={network}" for network in ("twitter", "facebook", "email"))
+        return hrefs
+
+    def _html(self, words, hrefs):
+        anchors = "".join(f'<li><a href="{href}">link</a></li>' for href in hrefs)
+        paragraphs = "".join(f"<p>{' '.join(words[i:i + 100])}</p>" for i in range(0, len(words), 100))
+        return (
+            "<html><head><title>Synthetic page</title><style>p {margin: 0}</style></head>"
+            f"<body>{paragraphs}<ul>{anchors}</ul><script>var x = 1;</script></body></html>").encode("utf-8")
+
+    def page(self, url):
+        ''' Returns (status, content) for url; content is None for errors. '''
+        parsed = urlparse(url)
+        host = parsed.hostname or ""
+        path = parsed.path
+        if not (host.startswith("h") and host.endswith(".ics.uci.edu")):
+            return 404, None
+        if path.startswith("/calendar/"):
+            day = path.rsplit("/", 1)[1]
+            if not day.isdigit() or int(day) > self.max_trap_depth:
+                return 404, None
+            # Every day shows the same listing with its own date: near duplicates all the way down.
+            words = self._text("calendar") + [f"day{day}"]
+            return 200, self._html(words, [f"/calendar/{int(day) + 1}", f"/calendar/{max(int(day) - 1, 0)}"])
+        if path.startswith("/a/b/") or path.startswith("/private/"):
+            return 200, self._html(self._text(path), [])
+        if not path.startswith("/p") or not path[2:].isdigit():
+            return 404, None
+        number = int(path[2:])
+        if number >= self.pages or host != f"h{number % self.hosts}.ics.uci.edu":
+            return 404, None
+        kind = self._kind(number)
+        if kind == "error":
+            return 404, None
+        hrefs = self._outlinks(number)
+        if kind == "small":
+            return 200, self._html(self._text(number)[:20], hrefs)
+        if kind == "duplicate" and number:
+            # Same text as an earlier page (the links differ, they are not part of the text).
+            if self._mirror(number):
+                return 200, self._html(self._text(f"mirror{self._random('original', number).randrange(20)}"), hrefs)
+            return 200, self._html(self._text(self._random("original", number).randrange(number)), hrefs)
+        changed = self.version and self._random("change", number, self.version).random() < self.changes
+        words = self._text(f"{number}.{self.version}" if changed else number)
+        if kind == "near duplicate" and number:
+            words = self._text(self._random("original", number).randrange(number))
+            rand = self._random("edit", number)
+            for _ in range(self.words // 100):
+                words[rand.randrange(len(words))] = rand.choice(self.vocabulary)
+        return 200, self._html(words, hrefs)
@@ -1,19 +1,32 @@
 from utils import get_logger
+from utils import metrics
 from crawler.frontier import Frontier
+from crawler.priority_frontier import PriorityFrontier
 from crawler.worker import Worker
+from crawler.async_worker import AsyncWorker
+import scraper
+
+# Worker implementations selectable with ENGINE in config.ini or --engine.
+ENGINES = {"threads": Worker, "asyncio": AsyncWorker}
+# Frontier implementations selectable with FRONTIER in config.ini.
+FRONTIERS = {"lifo": Frontier, "priority": PriorityFrontier}
 
 class Crawler(object):
-    def __init__(self, config, restart, frontier_factory=Frontier, worker_factory=Worker):
+    def __init__(self, config, restart, frontier_factory=None, worker_factory=None):
         self.config = config
         self.logger = get_logger("CRAWLER")
-        self.frontier = frontier_factory(config, restart)
+        metrics.init(config)
+        scraper.init(config)
+        self.frontier = (frontier_factory if frontier_factory else FRONTIERS[config.frontier])(config, restart)
         self.workers = list()
-        self.worker_factory = worker_factory
+        self.worker_factory = worker_factory if worker_factory else ENGINES[config.engine]
 
     def start_async(self):
+        # The asyncio engine runs every download from a single worker.
+        worker_count = 1 if self.worker_factory is AsyncWorker else self.config.threads_count
         self.workers = [
             self.worker_factory(worker_id, self.config, self.frontier)
-            for worker_id in range(self.config.threads_count)]
+            for worker_id in range(worker_count)]
         for worker in self.workers:
             worker.start()
 
@@ -24,3 +37,5 @@ class Crawler(object):
     def join(self):
         for worker in self.workers:
             worker.join()
+        scraper.close()
+        metrics.close()
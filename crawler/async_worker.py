@@ -0,0 +1,65 @@
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+
+from crawler.worker import Worker
+from utils.async_download import AsyncDownloader
+from utils.metrics import get_metrics
+import scraper
+
+
+class AsyncWorker(Worker):
+    ''' Runs the whole crawl on one asyncio event loop.
+
+    Up to config.max_in_flight urls are downloaded concurrently; the frontier
+    still decides when each host may be fetched. Scraping and frontier updates
+    block, so they run on a pool of config.threads_count threads. '''
+
+    def run(self):
+        asyncio.run(self._crawl())
+
+    async def _crawl(self):
+        loop = asyncio.get_running_loop()
+        in_flight = asyncio.Semaphore(self.config.max_in_flight)
+        # get_tbd_url blocks until a host is ready, so it gets a thread of its own.
+        dispatcher = ThreadPoolExecutor(max_workers=1)
+        executor = ThreadPoolExecutor(max_workers=self.config.threads_count)
+        downloader = AsyncDownloader(self.config, self.logger, executor)
+        tasks = set()
+        try:
+            while True:
+                await in_flight.acquire()
+                tbd_url = await loop.run_in_executor(dispatcher, self.frontier.get_tbd_url)
+                if not tbd_url:
+                    in_flight.release()
+                    self.logger.info("Frontier is empty. Stopping Crawler.")
+                    break
+                task = asyncio.create_task(self._process(tbd_url, downloader, executor, in_flight))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+        finally:
+            downloader.close()
+            dispatcher.shutdown()
+            executor.shutdown()
+
+    async def _process(self, tbd_url, downloader, executor, in_flight):
+        loop = asyncio.get_running_loop()
+        try:
+            with get_metrics().time("download"):
+                resp = await downloader.download(tbd_url)
+            get_metrics().count("pages")
+            get_metrics().count(f"status.{resp.status}")
+            self.logger.info(
+                f"Downloaded {tbd_url}, status <{resp.status}>, "
+                f"using cache {self.config.cache_server}.")
+            await loop.run_in_executor(executor, self._scrape, tbd_url, resp)
+        except Exception:
+            self.logger.exception(f"Failed to process {tbd_url}.")
+        finally:
+            await loop.run_in_executor(executor, self.frontier.mark_url_complete, tbd_url)
+            in_flight.release()
+
+    def _scrape(self, tbd_url, resp):
+        for scraped_url in scraper.scraper(tbd_url, resp):
+            self.frontier.add_url(scraped_url, parent=tbd_url)
@@ -1,17 +1,35 @@
 import os
+import time
 import shelve
 
-from threading import Thread, RLock
+from heapq import heappush, heappop, heapify
+from threading import Thread, RLock, Condition
 from queue import Queue, Empty
+from urllib.parse import urlparse
 
 from utils import get_logger, get_urlhash, normalize
-from scraper import is_valid
+from utils.metrics import get_metrics
+from scraper import is_valid, is_trap, in_stopped_trap, due_revisits, queue_revisit
+from utils.bloom import ScalableBloomFilter
+from utils.files import atomic_write
+from crawler.journal import FrontierJournal
 
 class Frontier(object):
     def __init__(self, config, restart):
         self.logger = get_logger("FRONTIER")
         self.config = config
-        self.to_be_downloaded = list()
+        # Urls are queued per host. A host with queued urls that is not being
+        # downloaded sits in the schedule heap, keyed by the time politeness
+        # allows it to be fetched again.
+        self.lock = RLock()
+        self.ready = Condition(self.lock)
+        self.host_queues = dict() # host -> list of urls, popped LIFO
+        self.schedule = list() # heap of (next allowed fetch time, host)
+        self.next_allowed = dict() # host -> earliest time of its next fetch
+        self.busy_hosts = dict() # host -> url handed to a worker
+        # host -> how many urls at the bottom of its queue were loaded on
+        # resume without is_valid; they are checked when dequeued.
+        self.unvalidated = dict()
         
         if not os.path.exists(self.config.save_file) and not restart:
             # Save file does not exist, but request to load save.
@@ -23,50 +41,300 @@ class Frontier(object):
             self.logger.info(
                 f"Found save file {self.config.save_file}, deleting it.")
             os.remove(self.config.save_file)
+        if os.path.exists(self.config.journal_file) and restart:
+            os.remove(self.config.journal_file)
+        for save_file in (self.config.seen_file, self.config.pending_file):
+            if os.path.exists(save_file) and restart:
+                os.remove(save_file)
         # Load existing save file, or create one if it does not exist.
         self.save = shelve.open(self.config.save_file)
+        # Number of urls the save file held when the checkpoint was written.
+        checkpointed_count = len(self.save)
+        # Changes are journaled in batches and compacted into the save file,
+        # replaying whatever a previous run left in the journal.
+        self.journal = FrontierJournal(
+            self.config.journal_file, self.save,
+            batch_size=self.config.journal_batch_size,
+            flush_interval=self.config.journal_flush_interval,
+            compact_size=self.config.journal_compact_size,
+            on_compact=self._checkpoint)
+        if self.journal.replayed:
+            self.logger.info(
+                f"Replayed {len(self.journal.replayed)} journaled urls into "
+                f"{self.config.save_file}.")
+        # Bloom filter of every urlhash in the save file. It answers most
+        # add_url lookups on its own; the save file is only read on a maybe.
+        self.seen = ScalableBloomFilter(
+            self.config.seen_file, capacity=self.config.seen_capacity,
+            error_rate=self.config.seen_error_rate)
+        if len(self.seen) != len(self.journal):
+            self._rebuild_seen()
+        metrics = get_metrics()
+        metrics.gauge("frontier_queued", lambda: sum(len(queue) for queue in list(self.host_queues.values())))
+        metrics.gauge("frontier_hosts", lambda: len(self.host_queues))
+        metrics.gauge("frontier_busy_hosts", lambda: len(self.busy_hosts))
+        metrics.gauge("frontier_host_backlog", self._host_backlog)
         if restart:
             for url in self.config.seed_urls:
                 self.add_url(url)
+            # Writes the seeds and a checkpoint, so a crawl stopped before its
+            # first compaction resumes without scanning the save file.
+            self.journal.compact()
         else:
-            # Set the frontier state with contents of save file.
-            self._parse_save_file()
+            # Set the frontier state from the pending checkpoint, or from the
+            # contents of the save file if there is no usable checkpoint.
+            if not self._load_checkpoint(checkpointed_count):
+                self._parse_save_file()
+            if self.journal.replayed:
+                # The replayed records went straight into the save file, which
+                # no longer matches the checkpoint; the next start would scan it.
+                self._checkpoint()
+            if self.config.recrawl:
+                self._queue_revisits()
             if not self.save:
                 for url in self.config.seed_urls:
                     self.add_url(url)
 
+    def _host_backlog(self, count=20):
+        # Hosts with the most queued urls, for the metrics snapshot.
+        with self.lock:
+            backlog = sorted(((len(queue), host) for host, queue in self.host_queues.items()), reverse=True)
+        return {host: queued for queued, host in backlog[:count]}
+
+    def _rebuild_seen(self):
+        # The filter is saved at each compaction, so a crash leaves it behind the save file.
+        self.logger.info(
+            f"Rebuilding {self.config.seen_file} from {self.config.save_file}.")
+        self.seen.clear()
+        for urlhash in self.save.keys():
+            self.seen.add(urlhash)
+        self.seen.save()
+
+    def _checkpoint(self):
+        # Called by the journal once the save file holds every change, so the
+        # seen filter and the pending queues written here match it exactly.
+        with self.lock:
+            self.seen.save()
+            self._save_pending()
+        self.logger.info(
+            f"Saved seen-url filter: {len(self.seen)} urls, "
+            f"{self.seen.memory()} bytes, false positive rate "
+            f"{self.seen.observed_error_rate():.5f} observed, "
+            f"{self.seen.estimated_error_rate():.5f} estimated.")
+
+    def _save_pending(self):
+        # Plain text, one url per line, grouped under a line per host:
+        #   frontier-pending <urls in the save file>
+        #   \t<next allowed fetch time>\t<host>
+        #   <url>  (bottom of the host's queue first)
+        # Urls handed to workers are not complete yet, so they go on top.
+        lines = [f"frontier-pending {len(self.save)}\n"]
+        for host in self.host_queues.keys() | self.busy_hosts.keys():
+            lines.append(f"\t{self.next_allowed.get(host, 0)}\t{host}\n")
+            lines.extend(f"{url}\n" for url in self.host_queues.get(host, ()))
+            if host in self.busy_hosts:
+                lines.append(f"{self.busy_hosts[host]}\n")
+        with atomic_write(self.config.pending_file, "w", encoding="utf-8") as pending:
+            pending.writelines(lines)
+
+    def _load_checkpoint(self, checkpointed_count):
+        ''' Loads the pending queues in one sequential read. Returns False if
+        the checkpoint is missing or was not written for this save file. '''
+        if not os.path.exists(self.config.pending_file):
+            return False
+        with open(self.config.pending_file, encoding="utf-8") as pending:
+            lines = pending.read().split("\n")
+        header = lines[0].split(" ")
+        if len(header) != 2 or header[0] != "frontier-pending" or int(header[1]) != checkpointed_count:
+            self.logger.info(
+                f"Ignoring {self.config.pending_file}, it does not match "
+                f"{self.config.save_file}.")
+            return False
+        queue = None
+        for line in lines[1:-1]:
+            if line.startswith("\t"):
+                _, next_allowed, host = line.split("\t", 2)
+                self.next_allowed[host] = float(next_allowed)
+                queue = self.host_queues[host] = list()
+            else:
+                queue.append(line)
+        # Changes replayed from the journal were made after the checkpoint
+        # (or just before it, if the crash came before the journal was truncated).
+        completed, added = set(), dict()
+        for url, done in self.journal.replayed.values():
+            if done:
+                completed.add(url)
+            else:
+                added.setdefault(urlparse(url).hostname, list()).append(url)
+        for host, urls in added.items():
+            queue = self.host_queues.setdefault(host, list())
+            queued = set(queue)
+            queue[:0] = [url for url in urls if url not in queued]
+        if completed:
+            for host, queue in self.host_queues.items():
+                queue[:] = [url for url in queue if url not in completed]
+        tbd_count = 0
+        for host, queue in list(self.host_queues.items()):
+            if not queue:
+                del self.host_queues[host]
+                continue
+            self.unvalidated[host] = len(queue)
+            tbd_count += len(queue)
+        self.schedule = [(self.next_allowed.get(host, 0), host) for host in self.host_queues]
+        heapify(self.schedule)
+        self.logger.info(
+            f"Loaded {tbd_count} urls to be downloaded from "
+            f"{self.config.pending_file}, {len(self.save)} total urls discovered.")
+        return True
+
     def _parse_save_file(self):
         ''' This function can be overridden for alternate saving techniques. '''
         total_count = len(self.save)
         tbd_count = 0
         for url, completed in self.save.values():
-            if not completed and is_valid(url):
-                self.to_be_downloaded.append(url)
+            if not completed:
+                self._enqueue(url)
                 tbd_count += 1
+        # is_valid runs when each url is dequeued, not here.
+        self.unvalidated = {host: len(queue) for host, queue in self.host_queues.items()}
         self.logger.info(
             f"Found {tbd_count} urls to be downloaded from {total_count} "
             f"total urls discovered.")
 
+    def _queue_revisits(self):
+        # Downloaded urls whose revisit is due are queued again, and journaled
+        # as incomplete so an interrupted recrawl resumes them. Only urls whose
+        # completion reached the save file count: the links they added were
+        # journaled before it, so they may be skipped if unchanged.
+        if not self.config.recrawl_enabled:
+            self.logger.warning(
+                "Nothing to recrawl: fetched pages are only tracked with "
+                "ENABLED = True in the RECRAWL section of the config file.")
+            return
+        count = 0
+        with self.lock:
+            for urlhash in due_revisits():
+                entry = self.journal.get(urlhash)
+                if entry is None or not entry[1]:
+                    continue # Unknown here, or queued already.
+                self._enqueue(entry[0])
+                self.journal.record(urlhash, entry[0], False)
+                queue_revisit(urlhash)
+                count += 1
+        self.logger.info(f"Queued {count} urls due for a revisit.")
+
+    def _enqueue(self, url, parent=None):
+        # parent is the url whose page linked to url, if any.
+        host = urlparse(url).hostname
+        with self.lock:
+            if host not in self.host_queues:
+                self.host_queues[host] = list()
+                if host not in self.busy_hosts:
+                    heappush(self.schedule, (self.next_allowed.get(host, 0), host))
+            self.host_queues[host].append(url)
+            self.ready.notify()
+
     def get_tbd_url(self):
-        try:
-            return self.to_be_downloaded.pop()
-        except IndexError:
-            return None
+        ''' Blocks until politeness allows some host to be fetched. Returns
+        None once nothing is queued and no worker can add more urls. '''
+        while True:
+            # Time spent here is mostly waiting for a host's politeness delay.
+            with get_metrics().time("politeness_wait"):
+                url, revalidate = self._next_url()
+            if url is not None and in_stopped_trap(url):
+                # Queued before its template was stopped: dropped, and marked
+                # complete so a resumed crawl does not queue it again.
+                with self.lock:
+                    self._release_host(urlparse(url).hostname, 0)
+                    self.journal.record(get_urlhash(url), url, True)
+                continue
+            if url is None or not revalidate or is_valid(url):
+                return url
+            # A resumed url that is no longer valid is dropped unfetched,
+            # so its host does not wait out the politeness delay.
+            self._release_host(urlparse(url).hostname, 0)
+
+    def _next_url(self):
+        # Returns (url, whether it was loaded on resume without is_valid).
+        with self.ready:
+            while True:
+                if self.schedule:
+                    next_time, host = self.schedule[0]
+                    wait = next_time - time.time()
+                    if wait <= 0:
+                        heappop(self.schedule)
+                        queue = self.host_queues[host]
+                        url = queue.pop()
+                        revalidate = len(queue) < self.unvalidated.get(host, 0)
+                        if revalidate:
+                            self.unvalidated[host] = len(queue)
+                        if not queue:
+                            del self.host_queues[host]
+                            self.unvalidated.pop(host, None)
+                        self.busy_hosts[host] = url
+                        return url, revalidate
+                    self.ready.wait(wait)
+                elif self.busy_hosts:
+                    # Urls being downloaded may still add more urls.
+                    self.ready.wait()
+                elif self._crawl_finished():
+                    # The crawl is over, fold the journal into the save file.
+                    self.journal.compact()
+                    self.ready.notify_all()
+                    return None, False
+
+    def _crawl_finished(self):
+        ''' Called (locked) when nothing is queued or being downloaded. Frontiers
+        that can be handed urls from elsewhere override it to wait for them,
+        returning False to look at the queues again. '''
+        return True
 
-    def add_url(self, url):
+    def add_url(self, url, parent=None):
+        with get_metrics().time("frontier_add"):
+            self._add_url(url, parent)
+
+    def _add_url(self, url, parent=None):
         url = normalize(url)
         urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            self.save[urlhash] = (url, False)
-            self.save.sync()
-            self.to_be_downloaded.append(url)
+        with self.lock:
+            if urlhash in self.seen:
+                if urlhash in self.journal:
+                    self._linked_again(url)
+                    return
+                self.seen.false_positive()
+            # Left out of the seen-set, so it is reconsidered if the template recovers.
+            if is_trap(url):
+                return
+            self.seen.add(urlhash)
+            # Queued before it is journaled, so a checkpoint taken by the record includes it.
+            self._enqueue(url, parent)
+            self.journal.record(urlhash, url, False)
     
+    def _linked_again(self, url):
+        ''' Called (locked) when a url already discovered is added again. '''
+        pass
+
     def mark_url_complete(self, url):
+        with get_metrics().time("frontier_complete"):
+            self._mark_url_complete(url)
+
+    def _mark_url_complete(self, url):
         urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            # This should not happen.
-            self.logger.error(
-                f"Completed url {url}, but have not seen it before.")
+        host = urlparse(url).hostname
+        with self.lock:
+            if urlhash not in self.seen or urlhash not in self.journal:
+                # This should not happen.
+                self.logger.error(
+                    f"Completed url {url}, but have not seen it before.")
+
+            self._release_host(host, self.config.time_delay)
+            self.journal.record(urlhash, url, True)
 
-        self.save[urlhash] = (url, True)
-        self.save.sync()
+    def _release_host(self, host, delay):
+        # The host may be fetched again once the politeness delay has passed.
+        with self.lock:
+            self.busy_hosts.pop(host, None)
+            self.next_allowed[host] = time.time() + delay
+            if host in self.host_queues:
+                heappush(self.schedule, (self.next_allowed[host], host))
+            self.ready.notify_all()
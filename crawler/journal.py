@@ -0,0 +1,110 @@
+import os
+
+from threading import Thread, RLock, Event
+
+
+class FrontierJournal(object):
+    ''' Write-behind log in front of the frontier save file.
+
+    Url state changes are kept in memory and appended to journal_file in
+    groups: a group is written and fsynced once batch_size records are
+    buffered or flush_interval seconds have passed, so a crash loses at most
+    that window. Once compact_size entries have accumulated they are applied
+    to the save file (the snapshot) with a single sync and the journal is
+    truncated. Entries left in the journal by a crash are replayed into the
+    snapshot when the journal is opened and kept in replayed, so the owner
+    can catch up on them. on_compact, if given, is called (with the journal
+    locked) once each compaction has synced the snapshot, before the journal
+    is truncated, so a crash in between replays the entries again. '''
+
+    def __init__(self, journal_file, save, batch_size=500, flush_interval=1.0, compact_size=50000, on_compact=None):
+        self.journal_file = journal_file
+        self.save = save
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compact_size = compact_size
+        self.on_compact = on_compact
+        self.lock = RLock()
+        self.entries = dict() # urlhash -> (url, completed), journaled but not yet in the snapshot
+        self.buffer = list() # journal lines not yet written
+        self.replayed = self._replay()
+        self.journal = open(self.journal_file, "a", encoding="utf-8")
+        self.stopped = Event()
+        self.flusher = Thread(target=self._flush_periodically, daemon=True)
+        self.flusher.start()
+
+    def __contains__(self, urlhash):
+        with self.lock:
+            return urlhash in self.entries or urlhash in self.save
+
+    def get(self, urlhash):
+        ''' (url, completed) of urlhash, or None if it was never recorded. '''
+        with self.lock:
+            if urlhash in self.entries:
+                return self.entries[urlhash]
+            return self.save.get(urlhash)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.save) + sum(1 for urlhash in self.entries if urlhash not in self.save)
+
+    def _replay(self):
+        replayed = dict() # urlhash -> (url, completed), last state only
+        if not os.path.exists(self.journal_file):
+            return replayed
+        with open(self.journal_file, encoding="utf-8") as journal:
+            for line in journal:
+                record = line.rstrip("\n").split("\t", 2)
+                # A torn last line (crash mid-write) is skipped.
+                if len(record) != 3 or record[0] not in ("0", "1") or not line.endswith("\n"):
+                    continue
+                completed, urlhash, url = record
+                replayed[urlhash] = (url, completed == "1")
+        for urlhash, value in replayed.items():
+            self.save[urlhash] = value
+        self.save.sync()
+        os.remove(self.journal_file)
+        return replayed
+
+    def _flush_periodically(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.flush()
+
+    def record(self, urlhash, url, completed):
+        with self.lock:
+            self.entries[urlhash] = (url, completed)
+            self.buffer.append(f"{int(completed)}\t{urlhash}\t{url}\n")
+            if len(self.buffer) >= self.batch_size:
+                self.flush()
+            if len(self.entries) >= self.compact_size:
+                self.compact()
+
+    def flush(self):
+        ''' Group commit: writes every buffered record with one fsync. '''
+        with self.lock:
+            if not self.buffer or self.journal.closed:
+                return
+            self.journal.writelines(self.buffer)
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+            self.buffer.clear()
+
+    def compact(self):
+        ''' Applies the journaled entries to the snapshot and truncates the journal. '''
+        with self.lock:
+            self.flush()
+            if not self.entries:
+                return
+            for urlhash, value in self.entries.items():
+                self.save[urlhash] = value
+            self.save.sync()
+            self.entries.clear()
+            if self.on_compact:
+                self.on_compact()
+            self.journal.truncate(0)
+
+    def close(self):
+        self.stopped.set()
+        with self.lock:
+            self.compact()
+            self.journal.close()
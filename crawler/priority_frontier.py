@@ -0,0 +1,194 @@
+import time
+
+from heapq import heappush, heappop
+from itertools import count
+from math import log2
+from urllib.parse import urlparse
+
+from utils import get_urlhash
+from scraper import get_page_store
+from crawler.frontier import Frontier
+
+
+class HostQueue(object):
+    ''' Urls of one host in a heap, best score first. A url whose score
+    changes is pushed again; the older entry is skipped when it surfaces. '''
+
+    def __init__(self):
+        self.heap = list() # (-score, sequence, url)
+        self.entries = dict() # url -> sequence of its live entry
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, url):
+        return url in self.entries
+
+    def __iter__(self):
+        # Worst first, like the bottom-first lists the pending checkpoint holds.
+        live = [entry for entry in self.heap if self.entries.get(entry[2]) == entry[1]]
+        return (url for _, _, url in sorted(live, reverse=True))
+
+    def push(self, url, score, sequence):
+        self.entries[url] = sequence
+        heappush(self.heap, (-score, sequence, url))
+
+    def _drop_stale(self):
+        while self.heap and self.entries.get(self.heap[0][2]) != self.heap[0][1]:
+            heappop(self.heap)
+
+    def best(self):
+        self._drop_stale()
+        return -self.heap[0][0]
+
+    def pop(self):
+        self._drop_stale()
+        _, _, url = heappop(self.heap)
+        del self.entries[url]
+        return url
+
+
+class PriorityFrontier(Frontier):
+    ''' Frontier that fetches the most promising url first instead of the
+    most recently added one.
+
+    A url scores
+        YIELDWEIGHT * yield of its path prefix (host and first directory)
+      + INLINKWEIGHT * log2(pages linking to it)
+      - DEPTHWEIGHT * links from the seed (or from where a resumed crawl started)
+    and a host, when politeness lets it be fetched, ranks by its best url
+    plus YIELDWEIGHT * its own yield. Yields are the share of fetched pages
+    that made it into the page store, i.e. passed the size, duplicate and
+    near-duplicate filters, smoothed towards 1/2 while few pages are known.
+    Scores are taken when a url is queued and again each time its in-link
+    count reaches a power of two, so enqueue and dequeue stay O(log n).
+
+    Hosts wait in the schedule heap for their politeness delay, as in
+    Frontier, then move to the ready heap ordered by rank. '''
+
+    def __init__(self, config, restart):
+        self.depth_weight = config.priority_depth_weight
+        self.inlink_weight = config.priority_inlink_weight
+        self.yield_weight = config.priority_yield_weight
+        self.sequence = count()
+        self.ready_hosts = list() # heap of (-rank, sequence, host) for hosts politeness allows
+        self.ready_rank = dict() # host -> sequence of its live entry in ready_hosts
+        self.depths = dict() # queued or busy url -> links from the seed
+        self.inlinks = dict() # queued url -> pages linking to it
+        self.host_yield = dict() # host -> [stored, fetched]
+        self.prefix_yield = dict() # (host, first directory) -> [stored, fetched]
+        self.resumed = set() # urls queued on resume without is_valid
+        super().__init__(config, restart)
+
+    @staticmethod
+    def _prefix(url):
+        parsed = urlparse(url)
+        directories = parsed.path.split("/")
+        return parsed.hostname, directories[1] if len(directories) > 2 else ""
+
+    @staticmethod
+    def _yield(stats):
+        stored, fetched = stats if stats else (0, 0)
+        return (stored + 1) / (fetched + 2)
+
+    def _score(self, url):
+        return (
+            self.yield_weight * self._yield(self.prefix_yield.get(self._prefix(url)))
+            + self.inlink_weight * log2(self.inlinks.get(url, 1))
+            - self.depth_weight * self.depths.get(url, 0))
+
+    def _make_ready(self, host):
+        rank = self.host_queues[host].best() + self.yield_weight * self._yield(self.host_yield.get(host))
+        sequence = next(self.sequence)
+        self.ready_rank[host] = sequence
+        heappush(self.ready_hosts, (-rank, sequence, host))
+
+    def _push(self, url, host):
+        self.host_queues[host].push(url, self._score(url), next(self.sequence))
+        if host in self.ready_rank:
+            # Already waiting to be picked: rank it again with this url.
+            self._make_ready(host)
+
+    def _enqueue(self, url, parent=None):
+        host = urlparse(url).hostname
+        with self.lock:
+            if url not in self.depths:
+                self.depths[url] = self.depths[parent] + 1 if parent in self.depths else 0
+            self.inlinks.setdefault(url, 1)
+            if host not in self.host_queues:
+                self.host_queues[host] = HostQueue()
+                if host not in self.busy_hosts:
+                    heappush(self.schedule, (self.next_allowed.get(host, 0), host))
+            self._push(url, host)
+            self.ready.notify()
+
+    def _linked_again(self, url):
+        if url not in self.inlinks:
+            return # Downloaded already.
+        self.inlinks[url] += 1
+        links = self.inlinks[url]
+        if links & (links - 1) == 0:
+            self._push(url, urlparse(url).hostname)
+
+    def _requeue_resumed(self):
+        # The base class loads resumed queues bottom first; they are queued
+        # again top first so that, scores being equal, their order is kept.
+        queues, self.host_queues = self.host_queues, dict()
+        self.schedule, self.unvalidated = list(), dict()
+        for queue in queues.values():
+            for url in reversed(list(queue)):
+                self.resumed.add(url)
+                self._enqueue(url)
+
+    def _load_checkpoint(self, checkpointed_count):
+        if not super()._load_checkpoint(checkpointed_count):
+            return False
+        self._requeue_resumed()
+        return True
+
+    def _parse_save_file(self):
+        super()._parse_save_file()
+        self._requeue_resumed()
+
+    def _next_url(self):
+        with self.ready:
+            while True:
+                now = time.time()
+                while self.schedule and self.schedule[0][0] <= now:
+                    _, host = heappop(self.schedule)
+                    self._make_ready(host)
+                if self.ready_hosts:
+                    _, sequence, host = heappop(self.ready_hosts)
+                    if self.ready_rank.get(host) != sequence:
+                        continue
+                    del self.ready_rank[host]
+                    queue = self.host_queues[host]
+                    url = queue.pop()
+                    if not queue:
+                        del self.host_queues[host]
+                    self.inlinks.pop(url, None)
+                    self.busy_hosts[host] = url
+                    revalidate = url in self.resumed
+                    self.resumed.discard(url)
+                    return url, revalidate
+                if self.schedule:
+                    self.ready.wait(self.schedule[0][0] - now)
+                elif self.busy_hosts:
+                    # Urls being downloaded may still add more urls.
+                    self.ready.wait()
+                elif self._crawl_finished():
+                    # The crawl is over, fold the journal into the save file.
+                    self.journal.compact()
+                    self.ready.notify_all()
+                    return None, False
+
+    def _mark_url_complete(self, url):
+        # Whether the page was stored decides the yield of its host and prefix.
+        stored = int(get_urlhash(url) in get_page_store())
+        with self.lock:
+            for stats, key in ((self.host_yield, urlparse(url).hostname), (self.prefix_yield, self._prefix(url))):
+                counts = stats.setdefault(key, [0, 0])
+                counts[0] += stored
+                counts[1] += 1
+            self.depths.pop(url, None)
+            super()._mark_url_complete(url)
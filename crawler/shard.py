@@ -0,0 +1,199 @@
+import os
+import zlib
+
+from functools import partial
+from multiprocessing import get_context
+from threading import Thread, Lock
+from urllib.parse import urlparse
+
+from utils import get_logger, get_urlhash, normalize
+from utils.download import cache_server_addresses
+from utils.metrics import get_metrics
+from crawler.frontier import Frontier
+from crawler.priority_frontier import PriorityFrontier
+
+
+def shard_of(url, shards):
+    ''' The shard that owns the host of url. crc32 rather than hash(), which
+    is salted per process. '''
+    host = urlparse(url).hostname or ""
+    return zlib.crc32(host.encode("utf-8")) % shards
+
+def shard_directory(shard):
+    # Each shard keeps its save files, stores and logs in a directory of its own.
+    return f"shard{shard}"
+
+
+class ShardState(object):
+    ''' Shared by the shard processes to tell when the whole crawl is over.
+
+    idle[i] is set by shard i when it has nothing queued or being downloaded,
+    and cleared when urls forwarded to it are queued. pending counts the urls
+    forwarded but not yet added to their shard's frontier. The crawl is over
+    once every shard is idle and nothing is pending; both are read and
+    written under one lock, so no shard can see a stale mix of the two. '''
+
+    def __init__(self, context, shards):
+        self.lock = context.Lock()
+        self.idle = context.Array("b", shards, lock=False)
+        self.pending = context.Value("q", 0, lock=False)
+        self.stopped = context.Value("b", 0, lock=False)
+
+    def sent(self, count):
+        with self.lock:
+            self.pending.value += count
+
+    def received(self, shard, count, busy):
+        with self.lock:
+            if busy:
+                self.idle[shard] = 0
+            self.pending.value -= count
+
+    def finished(self, shard):
+        with self.lock:
+            self.idle[shard] = 1
+            return bool(self.stopped.value) or (all(self.idle) and self.pending.value == 0)
+
+    def stop(self):
+        with self.lock:
+            self.stopped.value = 1
+
+
+class ShardedFrontier(Frontier):
+    ''' Frontier of one shard: it only queues urls of the hosts it owns
+    (shard_of) and forwards the others to their shard's inbox.
+
+    Forwarded urls are buffered per shard and sent as one batch when the url
+    that linked them is marked complete. A thread adds the batches arriving
+    in this shard's inbox through the ordinary add_url path, so the seen-set,
+    journal and politeness state of a host all live in its own shard. '''
+
+    # Urls forwarded recently are not sent again; the set is cleared past this size.
+    forwarded_size = 1 << 18
+
+    def __init__(self, config, restart, shard=0, inboxes=None, state=None):
+        self.shard = shard
+        self.inboxes = inboxes
+        self.state = state
+        self.outgoing = [list() for _ in inboxes] # shard -> urls waiting to be sent
+        self.forwarded = set()
+        self.forward_lock = Lock()
+        super().__init__(config, restart)
+        self.logger.info(f"Shard {shard} of {len(inboxes)}.")
+        get_metrics().gauge("shard_pending", lambda: self.state.pending.value)
+        # Seed urls of other shards are sent on right away.
+        self._flush()
+        self.receiver = Thread(target=self._receive, daemon=True)
+        self.receiver.start()
+
+    def get_tbd_url(self):
+        if self.state.stopped.value:
+            return None
+        return super().get_tbd_url()
+
+    def add_url(self, url, parent=None):
+        url = normalize(url)
+        owner = shard_of(url, len(self.inboxes))
+        if owner == self.shard:
+            super().add_url(url, parent)
+            return
+        urlhash = get_urlhash(url)
+        with self.forward_lock:
+            if urlhash in self.forwarded:
+                return
+            if len(self.forwarded) >= self.forwarded_size:
+                self.forwarded.clear()
+            self.forwarded.add(urlhash)
+            self.outgoing[owner].append(url)
+
+    def mark_url_complete(self, url):
+        # Sent before the host is released, so this shard cannot look idle
+        # while it still holds urls for others.
+        self._flush()
+        super().mark_url_complete(url)
+
+    def _flush(self):
+        with self.forward_lock:
+            for owner, urls in enumerate(self.outgoing):
+                if urls:
+                    # Counted before it is sent, so pending never undercounts.
+                    self.state.sent(len(urls))
+                    self.inboxes[owner].put(urls)
+                    get_metrics().count("shard_forwarded", len(urls))
+                    self.outgoing[owner] = list()
+
+    def _receive(self):
+        inbox = self.inboxes[self.shard]
+        while True:
+            urls = inbox.get()
+            if urls is None:
+                break
+            with self.lock:
+                for url in urls:
+                    super().add_url(url)
+                self.state.received(self.shard, len(urls), bool(self.schedule or self.busy_hosts))
+
+    def _crawl_finished(self):
+        self._flush()
+        if self.state.finished(self.shard):
+            return True
+        # Other shards are still crawling and may forward urls here.
+        self.ready.wait(0.1)
+        return False
+
+    def close(self):
+        # Stops the receiver once this shard's workers are done.
+        self.inboxes[self.shard].put(None)
+        self.receiver.join()
+
+
+class ShardedPriorityFrontier(ShardedFrontier, PriorityFrontier):
+    ''' ShardedFrontier ordering its own hosts' urls like PriorityFrontier.
+    Forwarded urls arrive without their parent, so they count as depth 0. '''
+
+
+# FRONTIER in config.ini -> frontier class of a shard.
+SHARDED_FRONTIERS = {"lifo": ShardedFrontier, "priority": ShardedPriorityFrontier}
+
+def run_shard(config, restart, shard, inboxes, state):
+    ''' Runs shard `shard` in its own directory, against its own cache server. '''
+    from crawler import Crawler
+    directory = shard_directory(shard)
+    os.makedirs(directory, exist_ok=True)
+    os.chdir(directory)
+    addresses = cache_server_addresses(config.cache_server)
+    config.cache_server = addresses[shard % len(addresses)]
+    if config.metrics_port:
+        config.metrics_port += shard
+    crawler = Crawler(config, restart, frontier_factory=partial(
+        SHARDED_FRONTIERS[config.frontier], shard=shard, inboxes=inboxes, state=state))
+    crawler.start()
+    crawler.frontier.close()
+
+def run_shards(config, restart, target=run_shard):
+    ''' Crawls with config.shards processes, each owning the hosts shard_of
+    assigns to it, running target (run_shard's arguments). Returns whether
+    every shard stopped cleanly. '''
+    logger = get_logger("SHARDS")
+    context = get_context("spawn")
+    inboxes = [context.Queue() for _ in range(config.shards)]
+    state = ShardState(context, config.shards)
+    processes = [
+        context.Process(target=target, args=(config, restart, shard, inboxes, state), name=f"shard{shard}")
+        for shard in range(config.shards)]
+    for process in processes:
+        process.start()
+    logger.info(f"Started {config.shards} shards.")
+    running = list(processes)
+    while running:
+        running[0].join(1)
+        for process in list(running):
+            if process.exitcode is None:
+                continue
+            running.remove(process)
+            if process.exitcode != 0:
+                # The others would wait forever for urls it was meant to forward.
+                logger.error(f"{process.name} exited with code {process.exitcode}, stopping the other shards.")
+                state.stop()
+    logger.info("Every shard has stopped.")
+    return all(process.exitcode == 0 for process in processes)
@@ -3,8 +3,8 @@ from threading import Thread
 from inspect import getsource
 from utils.download import download
 from utils import get_logger
+from utils.metrics import get_metrics
 import scraper
-import time
 
 
 class Worker(Thread):
@@ -23,12 +23,21 @@ class Worker(Thread):
             if not tbd_url:
                 self.logger.info("Frontier is empty. Stopping Crawler.")
                 break
-            resp = download(tbd_url, self.config, self.logger)
-            self.logger.info(
-                f"Downloaded {tbd_url}, status <{resp.status}>, "
-                f"using cache {self.config.cache_server}.")
-            scraped_urls = scraper.scraper(tbd_url, resp)
-            for scraped_url in scraped_urls:
-                self.frontier.add_url(scraped_url)
-            self.frontier.mark_url_complete(tbd_url)
-            time.sleep(self.config.time_delay)
+            try:
+                with get_metrics().time("download"):
+                    resp = download(tbd_url, self.config, self.logger)
+                get_metrics().count("pages")
+                get_metrics().count(f"status.{resp.status}")
+                self.logger.info(
+                    f"Downloaded {tbd_url}, status <{resp.status}>, "
+                    f"using cache {self.config.cache_server}.")
+                scraped_urls = scraper.scraper(tbd_url, resp)
+                for scraped_url in scraped_urls:
+                    self.frontier.add_url(scraped_url, parent=tbd_url)
+            except Exception:
+                # One bad page must not stop the worker, as in AsyncWorker.
+                self.logger.exception(f"Failed to process {tbd_url}.")
+            finally:
+                # Politeness is enforced by the frontier, which holds the host back
+                # for config.time_delay after this url is marked complete.
+                self.frontier.mark_url_complete(tbd_url)
@@ -1,15 +1,29 @@
+import os
 from configparser import ConfigParser
 from argparse import ArgumentParser
 
 from utils.server_registration import get_cache_server
 from utils.config import Config
 from crawler import Crawler
+from crawler.shard import run_shards, shard_directory
 
 
-def main(config_file, restart):
+def main(config_file, restart, engine=None, shards=None, recrawl=False):
     cparser = ConfigParser()
     cparser.read(config_file)
     config = Config(cparser)
+    if engine:
+        config.engine = engine
+    if shards:
+        config.shards = shards
+    config.recrawl = recrawl
+    if config.shards > 1:
+        # Save files live in the shards' directories, so the cache server
+        # is told whether the first shard has one to resume from.
+        fresh = restart or not os.path.exists(os.path.join(shard_directory(0), config.save_file))
+        config.cache_server = get_cache_server(config, fresh)
+        run_shards(config, restart)
+        return
     config.cache_server = get_cache_server(config, restart)
     crawler = Crawler(config, restart)
     crawler.start()
@@ -19,5 +33,8 @@ if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("--restart", action="store_true", default=False)
     parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument("--engine", choices=["threads", "asyncio"], default=None)
+    parser.add_argument("--shards", type=int, default=None)
+    parser.add_argument("--recrawl", action="store_true", default=False)
     args = parser.parse_args()
-    main(args.config_file, args.restart)
+    main(args.config_file, args.restart, args.engine, args.shards, args.recrawl)
@@ -3,33 +3,136 @@ import shelve
 from urllib.parse import urlparse, urljoin
 from bs4 import BeautifulSoup
 from collections import defaultdict
-import urllib.robotparser
 from utils import get_urlhash
 from collections import Counter
-from http.client import InvalidURL
 import hashlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from utils.near_duplicates import NearDuplicateIndex
+from utils.fingerprints import FingerprintIndex
+from utils.robots import RobotsCache
+from utils.extract import extract_text_and_links
+from utils.report import ReportAggregator
+from utils.page_store import PageStore
+from utils.metrics import get_metrics
+from utils.traps import TrapDetector
+from utils.revisits import RevisitStore
+import glob
+from argparse import ArgumentParser
+from configparser import ConfigParser
+
+# Shared indexes set up by init(); the detect_* functions fall back to a full scan without them.
+near_duplicate_index = None
+fingerprint_index = None
+robots_cache = None
+# Stored pages, shared by every worker (its writes are serialized internally).
+page_store = None
+# Pages are parsed in these processes when PARSERPROCESSES > 0, in the calling thread otherwise.
+parser_pool = None
+# "soup" parses pages into a BeautifulSoup tree, "fast" extracts them in one lxml pass.
+extractor = "soup"
+# Running report totals, updated as pages are stored.
+report_aggregator = None
+# Per-host url template statistics that hold back crawler traps; None when TRAPS is disabled.
+trap_detector = None
+# Content MD5 and revisit schedule of fetched pages; None when RECRAWL is disabled.
+revisit_store = None
+
+def init(config):
+    global near_duplicate_index, fingerprint_index, robots_cache, parser_pool, extractor, report_aggregator, page_store, trap_detector, revisit_store
+    extractor = config.extractor
+    page_store = PageStore(config.page_store)
+    # Moves the pages of a crawl that stored them in data.shelve into the page store.
+    if not len(page_store) and glob.glob('data.shelve*'):
+        with shelve.open('data.shelve') as shelve_file:
+            for key, record in shelve_file.items():
+                page_store.add(key, record[0], record[2], record[3], record[4])
+    report_aggregator = ReportAggregator(config.report_file, save_every=config.report_save_every)
+    if config.parser_processes > 0:
+        # Spawned rather than forked, the crawler already runs threads at this point.
+        parser_pool = ProcessPoolExecutor(
+            max_workers=config.parser_processes, mp_context=multiprocessing.get_context("spawn"))
+    robots_cache = RobotsCache(
+        config.robots_file, capacity=config.robots_cache_size, ttl=config.robots_ttl,
+        negative_ttl=config.robots_negative_ttl, timeout=config.robots_timeout)
+    fingerprint_index = FingerprintIndex(config.fingerprint_file)
+    revisit_store = None
+    if config.recrawl_enabled:
+        revisit_store = RevisitStore(
+            config.revisit_file, initial_interval=config.revisit_initial_interval,
+            min_interval=config.revisit_min_interval, max_interval=config.revisit_max_interval)
+    trap_detector = None
+    if config.traps_enabled:
+        trap_detector = TrapDetector(
+            window=config.trap_window, min_samples=config.trap_min_samples,
+            throttle_yield=config.trap_throttle_yield, throttle_every=config.trap_throttle_every,
+            stop_yield=config.trap_stop_yield, max_templates=config.trap_max_templates)
+        get_metrics().gauge("trap_templates", trap_detector.summary)
+    near_duplicate_index = NearDuplicateIndex(
+        config.near_index_file, threshold=config.near_threshold,
+        slots=config.minhash_slots, bands=config.lsh_bands)
+    # Index the pages of a crawl that was started before the indexes existed.
+    if len(near_duplicate_index) < len(page_store) or (len(page_store) and not len(fingerprint_index)):
+        for record, token_frequency in page_store.scan(with_terms=True):
+            fingerprint_index.add(bytes.fromhex(record.text_hash))
+            near_duplicate_index.add(record.urlhash, near_duplicate_index.signature(token_frequency.keys()))
+
+def close():
+    global near_duplicate_index, fingerprint_index, robots_cache, parser_pool, report_aggregator, page_store, trap_detector, revisit_store
+    # Saves whatever the periodic snapshots have not covered yet.
+    if report_aggregator is not None:
+        report_aggregator.save()
+    if parser_pool is not None:
+        parser_pool.shutdown()
+    # dbm.dumb only writes its index when closed, and keeps paths relative to
+    # the directory it was opened in, so every store is closed here.
+    for store in (robots_cache, fingerprint_index, near_duplicate_index, page_store, revisit_store):
+        if store is not None:
+            store.close()
+    near_duplicate_index = fingerprint_index = robots_cache = parser_pool = report_aggregator = None
+    page_store = trap_detector = revisit_store = None
+
+def get_page_store():
+    global page_store
+    if page_store is None:
+        page_store = PageStore('data')
+    return page_store
+
+def get_robots_cache():
+    global robots_cache
+    if robots_cache is None:
+        robots_cache = RobotsCache('robots.shelve')
+    return robots_cache
 
 # ********** HELPER FUNCTIONS **********
+def reject(where, reason, result=False):
+    # Counts why is_valid or extract_next_links turned a url down, then returns result.
+    get_metrics().count(f"rejected_{where}.{reason}")
+    return result
+
+# Used set instead of list since performing the 'in' operator against a set is about O(1).
+# Built once at import time rather than on every tokenize call.
+STOP_WORDS = frozenset({"a", "about", "above", "after", "again", "against", "all", "am", "an", "and", "any", "are", "aren't", "as", "at", "be", "because", "been", "before", 
+                        "being", "below", "between", "both", "but", "by", "can't", "cannot", "could", "couldn't", "did", "didn't", "do", "does", "doesn't", "doing", "don't", 
+                        "down", "during", "each", "few", "for", "from", "further", "had", "hadn't", "has", "hasn't", "have", "haven't", "having", "he", "he'd", "he'll", "he's", 
+                        "her", "here", "here's", "hers", "herself", "him", "himself", "his", "how", "how's", "i", "i'd", "i'll", "i'm", "i've", "if", "in", "into", "is", "isn't", 
+                        "it", "it's", "its", "itself", "let's", "me", "more", "most", "mustn't", "my", "myself", "no", "nor", "not", "of", "off", "on", "once", "only", "or", 
+                        "other", "ought", "our", "ours", "ourselves", "out", "over", "own", "same", "shan't", "she", "she'd", "she'll", "she's", "should", "shouldn't", "so", "some", 
+                        "such", "than", "that", "that's", "the", "their", "theirs", "them", "themselves", "then", "there", "there's", "these", "they", "they'd", "they'll", "they're", 
+                        "they've", "this", "those", "through", "to", "too", "under", "until", "up", "very", "was", "wasn't", "we", "we'd", "we'll", "we're", "we've", "were", "weren't", 
+                        "what", "what's", "when", "when's", "where", "where's", "which", "while", "who", "who's", "whom", "why", "why's", "with", "won't", "would", "wouldn't", "you", 
+                        "you'd", "you'll", "you're", "you've", "your", "yours", "yourself", "yourselves", "also", "can", "com", "following", "get", "make", "use", "will"})
+# Declaring alphanumeric pattern inlcuding ' and - to check the words in the text file provided
+WORD_PATTERN = re.compile(r"[a-zA-Z0-9]{3,}(?:'?[a-zA-Z0-9])*(?:-*[a-zA-Z0-9]+)*")
+
 # The tokenize function runs in linear-time relative to the number of words in the text O(n)
 def tokenize(text: str) -> list:
-    # Used set instead of list since performing the 'in' operator against a set is about O(1).
-    stop_words = {"a", "about", "above", "after", "again", "against", "all", "am", "an", "and", "any", "are", "aren't", "as", "at", "be", "because", "been", "before", 
-                  "being", "below", "between", "both", "but", "by", "can't", "cannot", "could", "couldn't", "did", "didn't", "do", "does", "doesn't", "doing", "don't", 
-                  "down", "during", "each", "few", "for", "from", "further", "had", "hadn't", "has", "hasn't", "have", "haven't", "having", "he", "he'd", "he'll", "he's", 
-                  "her", "here", "here's", "hers", "herself", "him", "himself", "his", "how", "how's", "i", "i'd", "i'll", "i'm", "i've", "if", "in", "into", "is", "isn't", 
-                  "it", "it's", "its", "itself", "let's", "me", "more", "most", "mustn't", "my", "myself", "no", "nor", "not", "of", "off", "on", "once", "only", "or", 
-                  "other", "ought", "our", "ours", "ourselves", "out", "over", "own", "same", "shan't", "she", "she'd", "she'll", "she's", "should", "shouldn't", "so", "some", 
-                  "such", "than", "that", "that's", "the", "their", "theirs", "them", "themselves", "then", "there", "there's", "these", "they", "they'd", "they'll", "they're", 
-                  "they've", "this", "those", "through", "to", "too", "under", "until", "up", "very", "was", "wasn't", "we", "we'd", "we'll", "we're", "we've", "were", "weren't", 
-                  "what", "what's", "when", "when's", "where", "where's", "which", "while", "who", "who's", "whom", "why", "why's", "with", "won't", "would", "wouldn't", "you", 
-                  "you'd", "you'll", "you're", "you've", "your", "yours", "yourself", "yourselves", "also", "can", "com", "following", "get", "make", "use", "will"}
-    
-    pattern = re.compile(r"[a-zA-Z0-9]{3,}(?:'?[a-zA-Z0-9])*(?:-*[a-zA-Z0-9]+)*") # Declaring alphanumeric pattern inlcuding ' and -                                                                     # to check the words in the text file provided 
     text = text.lower().rstrip() # Convert all words in line to lower-case and strip off any white space at end of line
-    words = re.findall(pattern, text) # find all words in line that match the aplhanumeric pattern declared above
+    words = WORD_PATTERN.findall(text) # find all words in line that match the aplhanumeric pattern declared above
     
     # Filter the words in text to remove the English stop words.
-    result = list(filter(lambda x: x not in stop_words, words))
+    result = [word for word in words if word not in STOP_WORDS]
     return result
 
 # The compute_word_frequencies function runs in linear time relative to the number of tokens in the list O(n)
@@ -41,40 +144,62 @@ def compute_word_frequencies(tokens: list) -> defaultdict:
     
     return frequencies
 
-def process_report():
+def stored_pages():
+    # Streams (url, token frequencies) of every stored page in one pass over the page store.
+    for record, token_frequency in get_page_store().scan(with_terms=True):
+        yield record.url, token_frequency
+
+def process_report(report_file='report.pickle', rebuild=False):
+    aggregator = ReportAggregator(report_file)
+    stored_count = len(get_page_store())
+    # The running totals are rebuilt when asked to, or when they missed pages (e.g. after a crash).
+    if rebuild or aggregator.pages != stored_count:
+        print(f"Rebuilding {report_file} from {stored_count} stored pages.")
+        aggregator.rebuild(stored_pages())
+
     with shelve.open('frontier.shelve') as shelve_file:
         print(f"1. Number of unique pages found: {len(shelve_file)}")
-    with shelve.open('data.shelve') as shelve_file:
-        print(f"2. Longest page in terms of the number of words: {shelve_file[max(shelve_file, key=lambda x: len(shelve_file[x][3]))][0]}")
-
-        all_word_freqs = defaultdict(int) # Initializing dictionary which will contain every word and its frequency from all web pages
-        # Iterate through all the word:frequency dictionaries corresponding to each webpage
-        for tup in shelve_file.values():
-            for word, freq in tup[3].items():
-                all_word_freqs[word] += freq # Add each word and its frequency to the master dictionary
-        all_word_freqs = sorted(all_word_freqs.items(), key=lambda x: x[1], reverse=True) # Sort the master dictionary by word frequency in descending order
-        
-        # Remove word:frequency pairings from master list that are not present in every webpage 
-        for pair in all_word_freqs:
-            for tup in shelve_file.values():
-                if (pair[0] not in tup[3]):
-                    all_word_freqs.remove(pair)
-                    break
-
-        top_50 = all_word_freqs[:50] # Cut down the list to only keep the top 50 words with the highest frequencies
-        print("3. 50 most common words in entire set of pages crawled:")
-        for word, frequency in top_50:
-            print(f"{word}: {frequency}")
-        
-        subdomains = []
-        # Iterate through the webpages and check if their domain is ics.uci.edu, if it is, add it to the subdomains list along with that webpage's url count
-        for tup in shelve_file.values():
-            if (re.match(r"^.+\.ics\.uci\.edu/?$", tup[0])):
-                subdomains.append((tup[0], tup[2]))
-        subdomains.sort(key=lambda x: x[0]) # Sort the subdomains alphabetically
-        print("4. ics.uci.edu subdomains and unique page count:")
-        for sub, count in subdomains:
-            print(f"{sub}, {count}")
+    print(f"2. Longest page in terms of the number of words: {aggregator.longest_page[0]}")
+
+    print("3. 50 most common words in entire set of pages crawled:")
+    for word, frequency in aggregator.most_common_words(50):
+        print(f"{word}: {frequency}")
+
+    print("4. ics.uci.edu subdomains and unique page count:")
+    for sub, count in aggregator.subdomains():
+        print(f"{sub}, {count}")
+
+# Everything extract_next_links needs from a page's html, small enough to send back from a parser process.
+ParsedPage = namedtuple("ParsedPage", ["text_length", "text_hash", "token_frequency", "outlinks"])
+
+def parse_page(content, base_url, extractor="soup"):
+    if extractor == "fast":
+        # One streaming lxml pass collects the text and the hrefs together.
+        text, hrefs = extract_text_and_links(content)
+    else:
+        soup = BeautifulSoup(content, 'lxml')
+        for element in soup(["script", "style", 'head', 'title', 'meta', '[document]']):
+            element.extract()
+        text = soup.get_text(" ", strip=True)
+        # soup.find_all('a') returns an iterable that stores the hyperlinks found in the current page.
+        hrefs = [hyperlink.get('href') for hyperlink in soup.find_all('a')]
+
+    # Pages with too little text are rejected by extract_next_links, don't tokenize them.
+    if len(text) < 500:
+        return ParsedPage(len(text), None, None, None)
+
+    if extractor == "fast":
+        token_frequency = dict(Counter(word for word in WORD_PATTERN.findall(text.lower()) if word not in STOP_WORDS))
+    else:
+        token_frequency = dict(compute_word_frequencies(tokenize(text)))
+
+    # href returns the hyperlink's destination, which could be a relative/absolute url. absolute_url.split('#')[0] removes fragment from url.
+    outlinks = []
+    for href in hrefs:
+        absolute_url = urljoin(base_url, href)
+        outlinks.append(absolute_url.split('#')[0])
+
+    return ParsedPage(len(text), hashlib.md5(text.encode()).hexdigest(), token_frequency, outlinks)
 
 def detect_repeating_path(parsed):
     directories = parsed.path.split('/')
@@ -83,28 +208,106 @@ def detect_repeating_path(parsed):
     if repeating_directories: # Checks if there are any repeating directories in the url path.
         return True
 
+def is_trap(url):
+    # Asked by the frontier before a new url is queued: templates whose fetches
+    # stopped yielding stored pages are throttled, then stopped.
+    if trap_detector is None:
+        return False
+    reason = trap_detector.admit(url)
+    if reason:
+        return reject("url", f"trap {reason}", True)
+    return False
+
+def in_stopped_trap(url):
+    return trap_detector is not None and trap_detector.stopped(url)
+
+def due_revisits():
+    # urlhashes of fetched pages whose revisit is due, for a recrawl.
+    return revisit_store.due() if revisit_store is not None else ()
+
+def queue_revisit(urlhash):
+    # Called by the frontier for each completed url it queues again for a recrawl.
+    if revisit_store is not None:
+        revisit_store.queue(urlhash)
+
 def detect_exact_similarity(text_hash):
-    with shelve.open('data.shelve') as shelve_file:
-        for key in shelve_file:
-            if text_hash == shelve_file[key][4]: # Checks if current page has a similar hash to any page already crawled.
-                return True
+    if fingerprint_index is not None:
+        return bytes.fromhex(text_hash) in fingerprint_index
+
+    for record, _ in get_page_store().scan():
+        if text_hash == record.text_hash: # Checks if current page has a similar hash to any page already crawled.
+            return True
     return False
 
-def detect_near_similarity(token_frequency):
-    with shelve.open('data.shelve') as shelve_file:
-        for key in shelve_file:
-            dict1_keys = token_frequency.keys()
-            dict2_keys = shelve_file[key][3].keys()
-            dicts_intersection = dict1_keys & dict2_keys
-            dicts_union = dict1_keys | dict2_keys
-            if dicts_union and len(dicts_intersection)/len(dicts_union) >= 0.9: # Checks if the similarity ratio between pages meets the 90% threshold.
-                return True
+def detect_near_similarity(token_frequency, signature=None, exclude=None):
+    # exclude is the urlhash of a recrawled page, whose earlier version should not count.
+    if near_duplicate_index is not None:
+        # Only pages sharing an LSH band with this one are compared.
+        if signature is None:
+            signature = near_duplicate_index.signature(token_frequency.keys())
+        # Stored pages are compared by token id; tokens no stored page has still count towards the union.
+        token_ids = page_store.ids_of(token_frequency.keys())
+        return near_duplicate_index.find(
+            signature, token_ids, page_store.term_ids, size=len(token_frequency), exclude=exclude) is not None
+
+    for record, stored_frequency in get_page_store().scan(with_terms=True):
+        if record.urlhash == exclude:
+            continue
+        dict1_keys = token_frequency.keys()
+        dict2_keys = stored_frequency.keys()
+        dicts_intersection = dict1_keys & dict2_keys
+        dicts_union = dict1_keys | dict2_keys
+        if dicts_union and len(dicts_intersection)/len(dicts_union) >= 0.9: # Checks if the similarity ratio between pages meets the 90% threshold.
+            return True
     return False
+
+# ********** PRE-PARSE FILTERS **********
+# Each filter returns why a response should not be parsed, or None. They run in order, before
+# extract_next_links decodes the cached response or parses any html, so cheaper checks go first.
+def reject_status(resp):
+    # Checks for valid status code.
+    # HTTP Code 301 = Redirected to new page permanetly, code needs to be allowed to index page.
+    # HTTP Code 302 = Redirected to new page temporarly, code is not accepted due to potential trap.
+    if resp.status not in [200, 301]:
+        return "status"
+
+def reject_size(resp):
+    # The encoded response is never smaller than the page, so small ones are rejected without decoding.
+    if resp.payload_size is not None and resp.payload_size < 8000:
+        return "size"
+    # Checks if the size of the page is greater than the current threshold.
+    page_size = resp.content_length
+    if page_size is None:
+        return "empty"
+    if page_size > 200000 or page_size < 8000: # 200000 bytes = 0.2 mb, 8000 bytes = 0.008 mb.
+        return "size"
+
+def reject_binary(resp):
+    content_type = resp.content_type
+    if content_type:
+        content_type = content_type.lower()
+        if not (content_type.startswith("text/") or "html" in content_type or "xml" in content_type):
+            return "content type"
+    # Without a Content-Type header, NUL bytes near the start give binary files away.
+    elif b"\x00" in resp.raw_response.content[:1024]:
+        return "binary"
+
+RESPONSE_FILTERS = [reject_status, reject_size, reject_binary]
+
+def rejection_reason(resp):
+    for response_filter in RESPONSE_FILTERS:
+        reason = response_filter(resp)
+        if reason:
+            return reason
+    return None
 # **************************************
 
 
 def scraper(url, resp):
     links = extract_next_links(url, resp)
+    if trap_detector is not None:
+        # Whatever kept the page out of the store (duplicate, error, too small) lowers its template's yield.
+        trap_detector.record(url, get_urlhash(url) in get_page_store())
     return [link for link in links if is_valid(link)]
 
 def extract_next_links(url, resp):
@@ -118,54 +321,75 @@ def extract_next_links(url, resp):
     #         resp.raw_response.content: the content of the page!
     # Return a list with the hyperlinks (as strings) scrapped from resp.raw_response.content
 
-    if not resp or not resp.raw_response:
-        return list()
-    
-    # Checks for valid status code.
-    # HTTP Code 301 = Redirected to new page permanetly, code needs to be allowed to index page.
-    # HTTP Code 302 = Redirected to new page temporarly, code is not accepted due to potential trap.
-    if resp.status not in [200, 301]:
+    if not resp:
         return list()
 
-    # Checks if the size of the page is greater than the current threshold.
-    page_size = len(resp.raw_response.content)
-    if page_size > 200000 or page_size < 8000: # 200000 bytes = 0.2 mb, 8000 bytes = 0.008 mb.
-        return list()
+    # Checks status, size and content type before the response is decoded or parsed.
+    reason = rejection_reason(resp)
+    if reason:
+        return reject("page", reason, list())
+
+    if not resp.raw_response:
+        return reject("page", "empty", list())
+
+    content = resp.raw_response.content
+    urlhash = get_urlhash(url)
+    # A page queued for a revisit whose content has not changed skips parsing, dedup
+    # and storage. Its links were followed when it was completed the first time.
+    if revisit_store is not None:
+        changed = revisit_store.observe(urlhash, hashlib.md5(content).digest())
+        if revisit_store.dequeue(urlhash) and not changed:
+            return reject("page", "unchanged", list())
+    # The earlier version of a recrawled page that changed.
+    previous = get_page_store().get(urlhash)
 
-    soup = BeautifulSoup(resp.raw_response.content, 'lxml')
-    for element in soup(["script", "style", 'head', 'title', 'meta', '[document]']):
-        element.extract()
-    text = soup.get_text(" ", strip=True)
+    # The html is parsed, tokenized and hashed in one step that can run in a parser process.
+    with get_metrics().time("parse"):
+        if parser_pool is not None:
+            page = parser_pool.submit(parse_page, content, resp.url, extractor).result()
+        else:
+            page = parse_page(content, resp.url, extractor)
 
     # Handles dead urls.
-    if resp.status == 200 and not text:
-        return list()
+    if resp.status == 200 and not page.text_length:
+        return reject("page", "dead", list())
 
     # Checks if the size of the page's text is sufficient enough to be crawled.
-    if len(text) < 500:
-        return list()
+    if page.text_length < 500:
+        return reject("page", "little text", list())
 
     # Checks for exact text duplication.
-    md5_hash = hashlib.md5(text.encode())
-    if detect_exact_similarity(md5_hash.hexdigest()):
-        return list()
+    with get_metrics().time("exact_dedup"):
+        duplicate = detect_exact_similarity(page.text_hash)
+    if duplicate:
+        if previous is not None and previous.text_hash == page.text_hash:
+            # Only the markup changed; the stored text stands, the links may be new.
+            return reject("page", "unchanged text", page.outlinks)
+        return reject("page", "exact duplicate", list())
 
     # Checks for near text duplication.
-    token_frequency = compute_word_frequencies(tokenize(text))
-    if detect_near_similarity(token_frequency):
-        return list()
+    token_frequency = page.token_frequency
+    with get_metrics().time("near_dedup"):
+        # Signed only now, so exact duplicates never pay for it.
+        signature = near_duplicate_index.signature(token_frequency.keys()) if near_duplicate_index is not None else None
+        duplicate = detect_near_similarity(token_frequency, signature, exclude=urlhash)
+    if duplicate:
+        return reject("page", "near duplicate", list())
 
-    # Iterates through the elements with anchor tag 'a'. soup.find_all('a') returns an iterable that stores the hyperlinks found in the current page. 
-    # hyperlink.get('href') returns the hyperlink's destination, which could be a relative/absolute url. absolute_url.split('#')[0] removes fragment from url.
-    urls = []
-    for hyperlink in soup.find_all('a'):
-        absolute_url = urljoin(resp.url, hyperlink.get('href'))
-        urls.append(absolute_url.split('#')[0])
+    urls = page.outlinks
 
-    with shelve.open('data.shelve') as shelve_file:
-        urlhash = get_urlhash(url)
-        shelve_file[urlhash] = (resp.url, resp, len(urls), token_frequency, md5_hash.hexdigest())
-        shelve_file.sync()
+    # Read before the new version supersedes it in the page store.
+    previous_frequency = get_page_store().token_frequency(urlhash) if previous is not None else None
+    get_page_store().add(urlhash, resp.url, len(urls), token_frequency, page.text_hash)
+    if fingerprint_index is not None:
+        fingerprint_index.add(bytes.fromhex(page.text_hash))
+    if near_duplicate_index is not None:
+        near_duplicate_index.add(urlhash, signature)
+    if report_aggregator is not None:
+        if previous_frequency is not None:
+            report_aggregator.replace_page(resp.url, previous_frequency, token_frequency)
+        else:
+            report_aggregator.add_page(resp.url, token_frequency)
 
     return urls
 
@@ -176,33 +400,24 @@ def is_valid(url):
     try:
         parsed = urlparse(url)
         if parsed.scheme not in set(["http", "https"]):
-            return False
+            return reject("url", "scheme")
         
         # Checks if domain is in the list of allowed domains.
         if not re.match(r".*\.(ics|cs|informatics|stat)\.uci\.edu", str(parsed.hostname)):
-            return False
-        
-        # Sets up the parser with the url of the domain/robots.txt file and reads the file.
-        shelve_file = shelve.open('robots.shelve')
-        if parsed.hostname in shelve_file:
-            robot_parser = shelve_file[parsed.hostname]
-        else:
-            robot_parser = urllib.robotparser.RobotFileParser()
-            robot_parser.set_url(f"{parsed.scheme}://{parsed.hostname}/robots.txt")
-            robot_parser.read()
-            shelve_file[parsed.hostname] = robot_parser
-            shelve_file.sync()
-        shelve_file.close()
+            return reject("url", "domain")
         
         # Checks if the current page can be crawled according to its robots.txt.
-        if not bool(robot_parser) or not robot_parser.can_fetch("*", url):
-            return False
+        # Hosts whose robots.txt could not be fetched are treated as disallowed.
+        with get_metrics().time("robots"):
+            allowed = get_robots_cache().can_fetch(url, parsed)
+        if not allowed:
+            return reject("url", "robots")
 
         # Checks if url has repeating directories.
         if detect_repeating_path(parsed):
-            return False
+            return reject("url", "repeating path")
         
-        return not re.match(
+        if re.match(
             r".*\.(css|js|bmp|gif|jpe?g|ico"
             + r"|png|tiff?|mid|mp2|mp3|mp4"
             + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
@@ -210,19 +425,21 @@ def is_valid(url):
             + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
             + r"|epub|dll|cnf|tgz|sha1"
             + r"|thmx|mso|arff|rtf|jar|csv"
-            + r"|rm|smil|wmv|swf|wma|zip|rar|gz)$", parsed.path.lower())
+            + r"|rm|smil|wmv|swf|wma|zip|rar|gz)$", parsed.path.lower()):
+            return reject("url", "extension")
+        return True
     except TypeError:
         print ("TypeError for ", parsed)
         raise
-    except urllib.error.URLError:
-        print(f"urllib.error.URLError when setting up robots.txt file for {url}")
-        shelve_file[parsed.hostname] = None
-        shelve_file.close()
-        return False
-    except InvalidURL:
-        print(f"http.client.InvalidURL when setting up robots.txt file for {url}")
-        return False
 
 
 if __name__ == '__main__':
-    process_report()
\ No newline at end of file
+    parser = ArgumentParser()
+    parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument("--rebuild", action="store_true", default=False,
+                        help="recompute the report totals from the page store in one pass")
+    args = parser.parse_args()
+    cparser = ConfigParser()
+    cparser.read(args.config_file)
+    page_store = PageStore(cparser.get("LOCAL PROPERTIES", "PAGESTORE", fallback="data"))
+    process_report(cparser.get("REPORT", "SAVE", fallback="report.pickle"), args.rebuild)
\ No newline at end of file
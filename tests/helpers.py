@@ -0,0 +1,40 @@
+''' Set-up shared by the tests that crawl the benchmark's SyntheticSite
+without a cache server. '''
+import os
+import tempfile
+import unittest
+
+import scraper
+from benchmark.scenarios import make_config
+from benchmark.server import answer
+from utils.response import Response
+
+
+def crawl_config(site, overrides=None):
+    ''' config.ini with the site's seed, no politeness delay and no metrics,
+    plus "SECTION.KEY": value overrides. '''
+    return make_config({"politeness": 0, "threads": 1}, {
+        "CRAWLER.SEEDURL": ",".join(site.seed_urls), "METRICS.ENABLED": False, **(overrides or {})})
+
+def init_scraper(config, site):
+    # robots.txt comes from the site, so no request leaves the machine.
+    scraper.init(config)
+    scraper.robots_cache.fetch = site.robots
+
+def fetch(site, url):
+    ''' What scraper.scraper returns for url, as served by the cache server. '''
+    return scraper.scraper(url, Response(answer(site, url)))
+
+
+class DirectoryTestCase(unittest.TestCase):
+    ''' Runs each test in a temporary working directory, where the crawler
+    writes its save files and Logs/. '''
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.TemporaryDirectory()
+        os.chdir(self.directory.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
@@ -0,0 +1,60 @@
+import json
+import os
+import unittest
+
+import scraper
+from benchmark.server import FakeCacheServer
+from benchmark.site import SyntheticSite
+from crawler import Crawler
+from tests.helpers import DirectoryTestCase, crawl_config
+from utils.page_store import PageStore
+
+
+class EngineTest(DirectoryTestCase):
+    ''' ENGINE = asyncio must store the same pages as ENGINE = threads when
+    crawling through a stand-in cache server that fails some requests. '''
+
+    # Every page is unique and no trap is linked, so the pages stored do not
+    # depend on the order in which they are fetched.
+    site = SyntheticSite(pages=80, duplicates=0, near_duplicates=0, traps=0, shares=0, mirrors=0)
+
+    def crawl(self, engine):
+        server = FakeCacheServer(self.site, failures=0.1).start()
+        os.mkdir(engine)
+        os.chdir(engine)
+        try:
+            config = crawl_config(self.site, {
+                "LOCAL PROPERTIES.THREADCOUNT": 4, "TRAPS.ENABLED": False, "METRICS.ENABLED": True,
+                "CONNECTION.BACKOFF": 0.01, "CONNECTION.MAXBACKOFF": 0.05})
+            config.engine = engine
+            config.cache_server = server.address
+            crawler = Crawler(config, True)
+            scraper.robots_cache.fetch = self.site.robots
+            crawler.start()
+            crawler.frontier.journal.close()
+            crawler.frontier.save.close()
+            with open(config.metrics_file) as snapshot_file:
+                counters = json.load(snapshot_file)["counters"]
+            store = PageStore(config.page_store)
+            stored = {record.url for record, _ in store.scan()}
+            store.close()
+            return stored, counters, server
+        finally:
+            os.chdir(self.directory.name)
+            server.close()
+
+    def test_asyncio_stores_the_same_pages_as_threads(self):
+        threads_pages, threads_counters, _ = self.crawl("threads")
+        asyncio_pages, asyncio_counters, server = self.crawl("asyncio")
+        self.assertGreater(len(threads_pages), 20)
+        self.assertEqual(asyncio_pages, threads_pages)
+        # Every 503 was retried until the page came through.
+        self.assertGreater(server.errors.value, 0)
+        for counters in (threads_counters, asyncio_counters):
+            self.assertNotIn("status.503", counters)
+        # Connections are kept alive across requests; a 503 closes its connection.
+        self.assertLess(server.connections.value, server.errors.value + server.requests.value // 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
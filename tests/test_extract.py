@@ -0,0 +1,47 @@
+import glob
+import os
+import unittest
+
+from benchmark.site import SyntheticSite
+from scraper import parse_page
+
+GOLDEN = os.path.join(os.path.dirname(__file__), "golden")
+
+
+class ExtractorTest(unittest.TestCase):
+    ''' EXTRACTOR = fast must parse every page exactly like EXTRACTOR = soup:
+    same text (hence length, MD5 and tokens) and same outlinks. '''
+
+    def assertSameParse(self, content, url):
+        soup = parse_page(content, url, "soup")
+        fast = parse_page(content, url, "fast")
+        self.assertEqual(soup, fast)
+        return soup
+
+    def test_golden_corpus(self):
+        paths = sorted(glob.glob(os.path.join(GOLDEN, "*.html")))
+        self.assertTrue(paths)
+        for path in paths:
+            with self.subTest(page=os.path.basename(path)):
+                with open(path, "rb") as page:
+                    parsed = self.assertSameParse(page.read(), "https://www.ics.uci.edu/dir/page.html")
+                if os.path.basename(path) != "short.html":
+                    self.assertGreaterEqual(parsed.text_length, 500)
+
+    def test_template_text_is_left_out(self):
+        content = b"<body>x<template><p>tp</p><a href='/t'>t</a></template>" + b" filler" * 100 + b"</body>"
+        parsed = self.assertSameParse(content, "https://www.ics.uci.edu/")
+        self.assertNotIn("tp", parsed.token_frequency)
+        self.assertEqual(parsed.outlinks, ["https://www.ics.uci.edu/t"])
+
+    def test_synthetic_site(self):
+        site = SyntheticSite(pages=60)
+        for number in range(60):
+            status, content = site.page(site.url(number))
+            if content is not None:
+                with self.subTest(page=number):
+                    self.assertSameParse(content, site.url(number))
+
+
+if __name__ == "__main__":
+    unittest.main()
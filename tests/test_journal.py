@@ -0,0 +1,102 @@
+import os
+import shelve
+import tempfile
+import unittest
+
+from multiprocessing import get_context
+
+from benchmark.site import SyntheticSite
+from crawler.journal import FrontierJournal
+from tests.helpers import crawl_config, init_scraper, fetch
+from utils import get_urlhash
+
+SITE = SyntheticSite(pages=50)
+
+
+class FrontierJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.journal_file = os.path.join(self.directory.name, "frontier.journal")
+        self.save = shelve.open(os.path.join(self.directory.name, "frontier.shelve"))
+
+    def tearDown(self):
+        self.save.close()
+        self.directory.cleanup()
+
+    def test_flushed_records_are_replayed(self):
+        journal = FrontierJournal(self.journal_file, self.save, flush_interval=3600)
+        journal.record("a", "https://www.ics.uci.edu/a", False)
+        journal.record("b", "https://www.ics.uci.edu/b", False)
+        journal.record("a", "https://www.ics.uci.edu/a", True)
+        journal.flush()
+        journal.record("c", "https://www.ics.uci.edu/c", False) # Never flushed.
+        journal.stopped.set()
+        journal.journal.close()
+        with open(self.journal_file, "a", encoding="utf-8") as torn:
+            torn.write("0\td\thttps://www.ics.uci.edu/d")
+
+        journal = FrontierJournal(self.journal_file, self.save, flush_interval=3600)
+        self.assertEqual(journal.replayed, {
+            "a": ("https://www.ics.uci.edu/a", True), "b": ("https://www.ics.uci.edu/b", False)})
+        self.assertEqual(journal.get("a"), ("https://www.ics.uci.edu/a", True))
+        self.assertNotIn("c", journal)
+        self.assertNotIn("d", journal)
+        journal.close()
+
+
+def _start(directory, recrawl, restart):
+    from crawler.frontier import Frontier
+    os.chdir(directory)
+    config = crawl_config(SITE, {"RECRAWL.ENABLED": recrawl, "LOCAL PROPERTIES.JOURNALFLUSHINTERVAL": 3600})
+    init_scraper(config, SITE)
+    return Frontier(config, restart)
+
+def _crawl_seed_then_crash(directory, recrawl, results):
+    frontier = _start(directory, recrawl, True)
+    frontier.journal.flush()
+    url = frontier.get_tbd_url()
+    links = fetch(SITE, url)
+    for link in links:
+        frontier.add_url(link, parent=url)
+    frontier.mark_url_complete(url)
+    results.send((url, links))
+    # Killed before the journal's next group commit: the outlinks and the
+    # completion of the seed are lost, the page and its fingerprints are not.
+    os._exit(0)
+
+def _resume(directory, recrawl, results):
+    frontier = _start(directory, recrawl, False)
+    url = frontier.get_tbd_url()
+    links = fetch(SITE, url)
+    for link in links:
+        frontier.add_url(link, parent=url)
+    results.send((url, links, sum(get_urlhash(link) in frontier.journal for link in links)))
+    os._exit(0)
+
+
+class CrashRecoveryTest(unittest.TestCase):
+    ''' A page whose outlink records were lost with the journal's unflushed
+    window is fetched again on resume and must give its outlinks back. '''
+
+    def _run(self, target, directory, recrawl):
+        context = get_context("spawn")
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=target, args=(directory, recrawl, sender))
+        process.start()
+        result = receiver.recv()
+        process.join()
+        return result
+
+    def test_outlinks_come_back_after_a_crash(self):
+        for recrawl in (False, True):
+            with self.subTest(recrawl_enabled=recrawl), tempfile.TemporaryDirectory() as directory:
+                seed, links = self._run(_crawl_seed_then_crash, directory, recrawl)
+                self.assertTrue(links)
+                url, resumed_links, journaled = self._run(_resume, directory, recrawl)
+                self.assertEqual(url, seed)
+                self.assertEqual(resumed_links, links)
+                self.assertEqual(journaled, len(set(links)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import random
+import tempfile
+import unittest
+
+from utils import get_urlhash
+from utils.near_duplicates import NearDuplicateIndex
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b)
+
+def corpus(rand, pages=300, vocabulary=20000, size=300):
+    ''' Distinct pages, and for some of them copies with a few tokens swapped
+    so that they sit just above or below the 0.9 threshold. '''
+    words = [f"word{number}" for number in range(vocabulary)]
+    originals = [set(rand.sample(words, size)) for _ in range(pages)]
+    variants = list()
+    for page in originals[:pages // 2]:
+        changed = rand.choice((2, 5, 8, 12, 20))
+        variant = set(rand.sample(sorted(page), size - changed)) | set(rand.sample(words, changed))
+        variants.append(variant)
+    return originals, variants
+
+
+class NearDuplicateIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.save_file = os.path.join(self.directory.name, "data.minhash")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _store(self, index, pages):
+        stored = dict()
+        for number, tokens in enumerate(pages):
+            key = get_urlhash(f"https://www.ics.uci.edu/{number}")
+            index.add(key, index.signature(tokens))
+            stored[key] = tokens
+        return stored
+
+    def test_recall_matches_brute_force(self):
+        rand = random.Random(7)
+        originals, variants = corpus(rand)
+        index = NearDuplicateIndex(self.save_file)
+        stored = self._store(index, originals)
+        expected = found = agreed = 0
+        for tokens in variants + originals[len(variants):]:
+            duplicate = any(jaccard(tokens, other) >= 0.9 for other in stored.values())
+            key = index.find(index.signature(tokens), tokens, stored.get)
+            expected += duplicate
+            found += key is not None
+            agreed += duplicate and key is not None
+            if key is not None:
+                # Candidates are confirmed exactly, so every hit is a real near duplicate.
+                self.assertGreaterEqual(jaccard(tokens, stored[key]), 0.9)
+        self.assertGreater(expected, 0)
+        self.assertEqual(found, agreed)
+        self.assertGreaterEqual(agreed / expected, 0.99)
+        index.close()
+
+    def test_reopen_replays_latest_signatures(self):
+        rand = random.Random(11)
+        originals, _ = corpus(rand, pages=20)
+        index = NearDuplicateIndex(self.save_file)
+        stored = self._store(index, originals)
+        # The first page changes completely: its old signature must stop matching.
+        first = next(iter(stored))
+        old_tokens, stored[first] = stored[first], {f"fresh{number}" for number in range(300)}
+        index.add(first, index.signature(stored[first]))
+        index.close()
+        with open(self.save_file, "ab") as save:
+            save.write(b"torn")
+
+        index = NearDuplicateIndex(self.save_file)
+        self.assertEqual(len(index), 20)
+        self.assertEqual(os.path.getsize(self.save_file), 21 * index.log.record_size)
+        self.assertIsNone(index.find(index.signature(old_tokens), old_tokens, stored.get))
+        self.assertEqual(index.find(index.signature(stored[first]), stored[first], stored.get), first)
+        self.assertIsNone(index.find(index.signature(stored[first]), stored[first], stored.get, exclude=first))
+        index.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
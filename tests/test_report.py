@@ -0,0 +1,41 @@
+import os
+import tempfile
+import unittest
+
+from unittest import mock
+
+from utils.report import ReportAggregator
+
+PAGES = [
+    ("https://www.ics.uci.edu/a", {"crawler": 3, "index": 1}),
+    ("https://vision.ics.uci.edu/b", {"crawler": 1, "vision": 5}),
+    ("https://www.stat.uci.edu/c", {"index": 2})]
+
+
+class ReportAggregatorTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.save_file = os.path.join(self.directory.name, "report.pickle")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_rebuild_saves_once_and_matches_running_totals(self):
+        running = ReportAggregator(self.save_file, save_every=1)
+        for url, token_frequency in PAGES:
+            running.add_page(url, token_frequency)
+
+        rebuilt = ReportAggregator(os.path.join(self.directory.name, "rebuilt.pickle"), save_every=1)
+        with mock.patch.object(rebuilt, "save", wraps=rebuilt.save) as save:
+            rebuilt.rebuild(iter(PAGES))
+        self.assertEqual(save.call_count, 1)
+        for report in (rebuilt, ReportAggregator(rebuilt.save_file)):
+            self.assertEqual(report.pages, 3)
+            self.assertEqual(report.term_counts, running.term_counts)
+            self.assertEqual(report.document_frequency, {"crawler": 2, "index": 2, "vision": 1})
+            self.assertEqual(report.longest_page, ("https://vision.ics.uci.edu/b", 6))
+            self.assertEqual(report.subdomains(), [("vision.ics.uci.edu", 1), ("www.ics.uci.edu", 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+
+from multiprocessing import get_context
+
+from benchmark.site import SyntheticSite
+from tests.helpers import crawl_config
+
+SITE = SyntheticSite(pages=50)
+
+
+def _run_then_crash(directory, restart, step, results):
+    from crawler.frontier import Frontier
+
+    class ScanningFrontier(Frontier):
+        scanned = False
+
+        def _parse_save_file(self):
+            self.scanned = True
+            super()._parse_save_file()
+
+    os.chdir(directory)
+    frontier = ScanningFrontier(crawl_config(SITE, {"LOCAL PROPERTIES.JOURNALFLUSHINTERVAL": 3600}), restart)
+    queued = sorted(url for queue in frontier.host_queues.values() for url in queue)
+    for number in range(5):
+        frontier.add_url(SITE.url(step * 5 + number + 1))
+    frontier.journal.flush()
+    results.send((frontier.scanned, queued))
+    # Stopped without a compaction, like a crawl killed before JOURNALCOMPACT changes.
+    os._exit(0)
+
+
+class ResumeTest(unittest.TestCase):
+    def _run(self, directory, restart, step):
+        context = get_context("spawn")
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_run_then_crash, args=(directory, restart, step, sender))
+        process.start()
+        result = receiver.recv()
+        process.join()
+        return result
+
+    def test_every_resume_loads_the_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self._run(directory, True, 0)
+            expected = sorted([SITE.seed_urls[0]] + [SITE.url(number) for number in range(1, 6)])
+            for step in range(1, 4):
+                scanned, queued = self._run(directory, False, step)
+                self.assertEqual(queued, expected)
+                self.assertFalse(scanned, f"resume {step} scanned the save file")
+                expected = sorted(expected + [SITE.url(step * 5 + number) for number in range(1, 6)])
+
+
+if __name__ == "__main__":
+    unittest.main()
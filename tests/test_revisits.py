@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+
+import scraper
+from benchmark.site import SyntheticSite
+from tests.helpers import DirectoryTestCase, crawl_config, init_scraper, fetch
+from utils import get_urlhash
+from utils.revisits import RevisitStore
+
+
+class RevisitStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.save_file = os.path.join(self.directory.name, "data.revisits")
+        self.urlhash = get_urlhash("https://www.ics.uci.edu/")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_intervals_adapt_and_survive_reopen(self):
+        store = RevisitStore(self.save_file, initial_interval=100, min_interval=50, max_interval=300)
+        self.assertTrue(store.observe(self.urlhash, b"a" * 16, fetched_at=0))
+        self.assertFalse(store.observe(self.urlhash, b"a" * 16, fetched_at=100))
+        self.assertEqual(store.get(self.urlhash).interval, 200)
+        self.assertFalse(store.observe(self.urlhash, b"a" * 16, fetched_at=300))
+        self.assertEqual(store.get(self.urlhash).interval, 300)
+        self.assertTrue(store.observe(self.urlhash, b"b" * 16, fetched_at=600))
+        self.assertEqual(store.get(self.urlhash).interval, 150)
+        store.close()
+
+        store = RevisitStore(self.save_file, initial_interval=100, min_interval=50, max_interval=300)
+        revisit = store.get(self.urlhash)
+        self.assertEqual((revisit.fetches, revisit.changes, revisit.interval), (4, 1, 150))
+        self.assertEqual(list(store.due(now=749)), [])
+        self.assertEqual(list(store.due(now=750)), [self.urlhash])
+        self.assertAlmostEqual(store.change_rate(self.urlhash), 1 / 3)
+        store.close()
+
+    def test_dequeue_forgets(self):
+        store = RevisitStore(self.save_file)
+        store.queue(self.urlhash)
+        self.assertTrue(store.dequeue(self.urlhash))
+        self.assertFalse(store.dequeue(self.urlhash))
+        store.close()
+
+
+class UnchangedPageTest(DirectoryTestCase):
+    ''' Only a page the frontier queued for a revisit is skipped as unchanged. '''
+
+    def setUp(self):
+        super().setUp()
+        self.site = SyntheticSite(pages=50)
+        init_scraper(crawl_config(self.site, {"RECRAWL.ENABLED": True}), self.site)
+
+    def tearDown(self):
+        scraper.close()
+        super().tearDown()
+
+    def fetch(self, url):
+        return fetch(self.site, url)
+
+    def test_refetch_follows_links_again(self):
+        url = self.site.seed_urls[0]
+        links = self.fetch(url)
+        self.assertTrue(links)
+        # Fetched again without being queued for a revisit, e.g. after a crash.
+        self.assertEqual(self.fetch(url), links)
+        scraper.queue_revisit(get_urlhash(url))
+        self.assertEqual(self.fetch(url), [])
+        self.assertEqual(self.fetch(url), links)
+
+
+if __name__ == "__main__":
+    unittest.main()
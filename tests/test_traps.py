@@ -0,0 +1,130 @@
+import logging
+import unittest
+
+import scraper
+from benchmark.site import SyntheticSite
+from crawler.frontier import Frontier
+from tests.helpers import DirectoryTestCase, crawl_config, init_scraper, fetch
+from utils import get_urlhash
+from utils.traps import TrapDetector, url_template
+
+HOST = "https://h1.ics.uci.edu"
+
+
+class UrlTemplateTest(unittest.TestCase):
+    def test_shapes(self):
+        for url, template in (
+                (f"{HOST}/wiki/Page?action=edit&oldid=12", "/wiki/Page?action&oldid"),
+                (f"{HOST}/calendar/2019-03-01", "/calendar/<n>-<n>-<n>"),
+                (f"{HOST}/item/3f2a9c0e1b7d4a6f8e9d", "/item/<id>"),
+                (f"{HOST}/a/{'x' * 70}/b", "/a/<long>/b"),
+                (f"{HOST}/p12?share=twitter", "/p<n>?share"),
+                (f"{HOST}/p12?sid=5&share=x&sid=6", "/p<n>?share&sid"),
+                (f"{HOST}/", "/")):
+            with self.subTest(url=url):
+                self.assertEqual(url_template(url), template)
+
+
+class TrapDetectorTest(DirectoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.detector = TrapDetector(window=10, min_samples=5, throttle_yield=0.2, throttle_every=4, stop_yield=0.05)
+
+    def calendar(self, day):
+        return f"{HOST}/calendar/{day}"
+
+    def test_open_throttled_stopped(self):
+        with self.assertLogs("TRAPS", logging.INFO) as logs:
+            self.detector.record(self.calendar(0), True)
+            for day in range(1, 5):
+                self.detector.record(self.calendar(day), False)
+            # 1 of 5 stored is not below the throttle yield.
+            self.assertEqual(self.detector.summary()["open"], 1)
+            self.detector.record(self.calendar(5), False)
+            self.assertEqual(self.detector.summary()["throttled"], 1)
+            # 1 of the last 10 stored: still throttled, not stopped.
+            for day in range(6, 10):
+                self.detector.record(self.calendar(day), False)
+            self.assertEqual(self.detector.summary()["throttled"], 1)
+            # The stored fetch leaves the window.
+            self.detector.record(self.calendar(10), False)
+        self.assertEqual(self.detector.summary(), {"open": 0, "throttled": 0, "stopped": 1})
+        self.assertTrue(self.detector.stopped(self.calendar(500)))
+        self.assertEqual(self.detector.admit(self.calendar(500)), "stopped")
+        self.assertEqual(len(logs.output), 2)
+        self.assertIn("open -> throttled, 1 of the last 6", logs.output[0])
+        self.assertIn("throttled -> stopped, 0 of the last 10", logs.output[1])
+
+    def test_recovers_when_yield_returns(self):
+        for day in range(5):
+            self.detector.record(self.calendar(day), False)
+        for day in range(5, 10):
+            self.detector.record(self.calendar(day), True)
+        self.assertEqual(self.detector.summary()["open"], 1)
+
+    def test_throttled_admission_is_decided_by_urlhash(self):
+        for day in range(5):
+            self.detector.record(self.calendar(day), False)
+        urls = [self.calendar(day) for day in range(100, 500)]
+        first = [self.detector.admit(url) for url in urls]
+        self.assertEqual([self.detector.admit(url) for url in urls], first)
+        self.assertEqual(set(first), {None, "throttled"})
+        admitted = [url for url, reason in zip(urls, first) if reason is None]
+        self.assertEqual(admitted, [url for url in urls if int(get_urlhash(url)[:8], 16) % 4 == 0])
+
+    def test_overflow_template_is_stopped_too(self):
+        detector = TrapDetector(window=10, min_samples=5, max_templates=1)
+        detector.admit(f"{HOST}/index")
+        for number in range(10):
+            detector.record(f"{HOST}/section{number}/" + "x" * number, False)
+        self.assertEqual(detector.admit(f"{HOST}/elsewhere/page"), "stopped")
+        self.assertTrue(detector.stopped(f"{HOST}/elsewhere/page"))
+        self.assertFalse(detector.stopped(f"{HOST}/index"))
+
+
+class FrontierTrapTest(DirectoryTestCase):
+    ''' Urls queued before their template stopped are dropped at dequeue. '''
+
+    def setUp(self):
+        super().setUp()
+        self.site = SyntheticSite(pages=50)
+        self.config = crawl_config(self.site, {"TRAPS.WINDOW": 10, "TRAPS.MINSAMPLES": 5})
+        init_scraper(self.config, self.site)
+        self.frontier = Frontier(self.config, True)
+
+    def tearDown(self):
+        self.frontier.journal.close()
+        self.frontier.save.close()
+        scraper.close()
+        super().tearDown()
+
+    def test_stopped_urls_are_dropped_at_dequeue(self):
+        page = self.site.url(1)
+        calendar = [f"{HOST}/calendar/{day}" for day in range(20)]
+        shares = [f"{page}?share={network}{number}" for network in ("twitter", "email") for number in range(10)]
+        for url in calendar + shares:
+            self.frontier.add_url(url)
+        # Every calendar day is a near duplicate of the first one fetched, and
+        # every ?share= variant an exact duplicate of the page.
+        for day in range(100, 112):
+            fetch(self.site, f"{HOST}/calendar/{day}")
+        fetch(self.site, page)
+        for number in range(12):
+            fetch(self.site, f"{page}?share=facebook{number}")
+        for url in (calendar[0], shares[0]):
+            self.assertTrue(scraper.in_stopped_trap(url), url)
+
+        dequeued = list()
+        while True:
+            url = self.frontier.get_tbd_url()
+            if url is None:
+                break
+            dequeued.append(url)
+            self.frontier.mark_url_complete(url)
+        self.assertEqual(dequeued, self.site.seed_urls)
+        for url in calendar + shares:
+            self.assertEqual(self.frontier.journal.get(get_urlhash(url)), (url, True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import logging
+import unittest
+
+from types import SimpleNamespace
+from unittest import mock
+
+from crawler.worker import Worker
+from tests.helpers import DirectoryTestCase
+
+
+class ListFrontier(object):
+    def __init__(self, urls):
+        self.urls = list(urls)
+        self.completed = list()
+
+    def get_tbd_url(self):
+        return self.urls.pop(0) if self.urls else None
+
+    def add_url(self, url, parent=None):
+        pass
+
+    def mark_url_complete(self, url):
+        self.completed.append(url)
+
+
+class WorkerTest(DirectoryTestCase):
+    def test_failed_page_does_not_stop_the_worker(self):
+        urls = ["https://www.ics.uci.edu/1", "https://www.ics.uci.edu/2"]
+        frontier = ListFrontier(urls)
+        worker = Worker(0, SimpleNamespace(cache_server=None), frontier)
+        with mock.patch("crawler.worker.download", return_value=SimpleNamespace(status=200)), \
+                mock.patch("scraper.scraper", side_effect=ValueError("unparsable page")), \
+                self.assertLogs(worker.logger, logging.ERROR):
+            worker.start()
+            worker.join(10)
+        self.assertFalse(worker.is_alive())
+        self.assertEqual(frontier.completed, urls)
+
+
+if __name__ == "__main__":
+    unittest.main()
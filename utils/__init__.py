@@ -1,7 +1,8 @@
 import os
 import logging
+from functools import lru_cache
 from hashlib import sha256
-from urllib.parse import urlparse
+from urllib.parse import urlparse, urlsplit, urlunsplit
 
 def get_logger(name, filename=None):
     logger = logging.getLogger(name)
@@ -22,6 +23,8 @@ def get_logger(name, filename=None):
     return logger
 
 
+# Most outlinks repeat urls seen shortly before, so both are memoized.
+@lru_cache(maxsize=1 << 16)
 def get_urlhash(url):
     parsed = urlparse(url)
     # everything other than scheme.
@@ -29,7 +32,23 @@ def get_urlhash(url):
         f"{parsed.netloc}/{parsed.path}/{parsed.params}/"
         f"{parsed.query}/{parsed.fragment}".encode("utf-8")).hexdigest()
 
+# Port suffixes dropped from urls because the scheme implies them.
+DEFAULT_PORTS = {"http": ":80", "https": ":443"}
+
+@lru_cache(maxsize=1 << 16)
 def normalize(url):
+    # Equivalent urls are written one way so they hash to the same urlhash:
+    # lower-case scheme and host, no default port, sorted query parameters.
+    scheme, netloc, path, query, fragment = urlsplit(url)
+    if netloc:
+        userinfo, at, host = netloc.rpartition("@")
+        scheme, host = scheme.lower(), host.lower()
+        default_port = DEFAULT_PORTS.get(scheme)
+        if default_port and host.endswith(default_port):
+            host = host[:-len(default_port)]
+        if "&" in query:
+            query = "&".join(sorted(query.split("&")))
+        url = urlunsplit((scheme, f"{userinfo}{at}{host}", path, query, fragment))
     if url.endswith("/"):
         return url.rstrip("/")
     return url
@@ -0,0 +1,123 @@
+import asyncio
+import random
+import cbor
+
+from itertools import count
+from urllib.parse import urlencode
+
+from utils.download import cache_server_addresses
+from utils.response import Response
+
+
+class AsyncDownloader(object):
+    ''' asyncio counterpart of utils.download.download.
+
+    Speaks just enough HTTP/1.1 to query the cache server over keep-alive
+    connections pooled per address, with the same timeouts, retries and
+    round-robin over the load balancer as the threaded download. Decoding
+    the CBOR payload (which unpickles the cached response) is handed to
+    executor so it does not stall the event loop. '''
+
+    def __init__(self, config, logger=None, executor=None):
+        self.config = config
+        self.logger = logger
+        self.executor = executor
+        self.addresses = cache_server_addresses(config.cache_server)
+        self.next_address = count()
+        self.idle = {address: list() for address in self.addresses} # address -> [(reader, writer), ...]
+
+    async def download(self, url):
+        config = self.config
+        loop = asyncio.get_running_loop()
+        status, body, error = None, None, None
+        for attempt in range(config.download_retries + 1):
+            if attempt:
+                delay = min(config.download_backoff * 2 ** (attempt - 1), config.download_max_backoff)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+            address = self.addresses[next(self.next_address) % len(self.addresses)]
+            try:
+                status, body = await self._get(address, url)
+            except (OSError, EOFError, ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                status, body, error = None, None, e
+                continue
+            if status < 500:
+                break
+        try:
+            if status is not None and status < 400 and body:
+                return await loop.run_in_executor(self.executor, self._decode, body)
+        except (EOFError, ValueError) as e:
+            pass
+        if status is None:
+            message = f"Spacetime connection error {error!r} with url {url}."
+        else:
+            message = f"Spacetime Response error <Response [{status}]> with url {url}."
+        if self.logger:
+            self.logger.error(message)
+        return Response({"error": message, "status": status, "url": url})
+
+    @staticmethod
+    def _decode(body):
+        return Response(cbor.loads(body))
+
+    async def _get(self, address, url):
+        host, port = address
+        if self.idle[address]:
+            reader, writer = self.idle[address].pop()
+        else:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port), self.config.connect_timeout)
+        try:
+            query = urlencode([("q", f"{url}"), ("u", f"{self.config.user_agent}")])
+            writer.write(
+                f"GET /?{query} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+                f"Accept-Encoding: identity\r\nConnection: keep-alive\r\n\r\n".encode("latin-1"))
+            status, body, keep_alive = await asyncio.wait_for(
+                self._read_response(reader), self.config.read_timeout)
+        except BaseException:
+            writer.close()
+            raise
+        if keep_alive:
+            self.idle[address].append((reader, writer))
+        else:
+            writer.close()
+        return status, body
+
+    @staticmethod
+    async def _read_response(reader):
+        status_line = (await reader.readline()).decode("latin-1")
+        if not status_line:
+            raise EOFError("Cache server closed the connection.")
+        version, status = status_line.split(None, 2)[:2]
+        headers = dict()
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        keep_alive = (
+            version == "HTTP/1.1" and headers.get("connection", "").lower() != "close")
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            chunks = list()
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if not size:
+                    # Skip the trailer section.
+                    while (await reader.readline()).strip():
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            keep_alive = False
+        return int(status), body, keep_alive
+
+    def close(self):
+        for connections in self.idle.values():
+            for _, writer in connections:
+                writer.close()
+            connections.clear()
@@ -0,0 +1,157 @@
+import os
+import math
+import struct
+
+from threading import RLock
+
+from utils.files import atomic_write
+
+# count, false positives, negatives, number of filters
+_HEADER = struct.Struct("<QQQI")
+# capacity, items, hash count, bits, error rate
+_FILTER = struct.Struct("<QQIQd")
+
+
+class _BloomFilter(object):
+    ''' Fixed-size Bloom filter sized for capacity items at error_rate. '''
+
+    def __init__(self, capacity, error_rate, items=0, hash_count=None, bits=None, data=None):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.items = items
+        self.bits = bits if bits else max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = hash_count if hash_count else max(1, round(self.bits / capacity * math.log(2)))
+        self.data = data if data is not None else bytearray((self.bits + 7) // 8)
+
+    # Double hashing: the i-th probed bit is h1 + i * h2 (Kirsch-Mitzenmacher).
+
+    def contains(self, h1, h2):
+        data, bits = self.data, self.bits
+        for i in range(self.hash_count):
+            bit = (h1 + i * h2) % bits
+            if not data[bit >> 3] & (1 << (bit & 7)):
+                return False # Most keys that were never added stop at the first probes.
+        return True
+
+    def add(self, h1, h2):
+        data, bits = self.data, self.bits
+        for i in range(self.hash_count):
+            bit = (h1 + i * h2) % bits
+            data[bit >> 3] |= 1 << (bit & 7)
+        self.items += 1
+
+    def estimated_error_rate(self):
+        # Chance that every probed bit is set for a key that was never added.
+        return (1 - math.exp(-self.hash_count * self.items / self.bits)) ** self.hash_count
+
+
+class ScalableBloomFilter(object):
+    ''' Membership test for url hashes that may answer "maybe" but never
+    misses a key that was added.
+
+    Keys are the hex SHA-256 digests from get_urlhash, so the two probe
+    hashes are read straight out of the digest instead of hashing again.
+    When the newest filter reaches its capacity a filter growth times larger
+    with a tighter error rate is added (Almeida et al.), which keeps the
+    overall false positive rate under error_rate however many urls are seen.
+    False positives and negative answers are counted so the observed rate can
+    be reported next to the estimate. '''
+
+    def __init__(self, save_file, capacity=1000000, error_rate=0.001, growth=2, tightening=0.5):
+        self.save_file = save_file
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.lock = RLock()
+        self._reset()
+        if os.path.exists(self.save_file):
+            try:
+                self._load()
+            except (struct.error, ValueError):
+                self._reset() # A damaged save file is rebuilt by the owner.
+
+    def _reset(self):
+        self.count = 0
+        self.false_positives = 0
+        self.negatives = 0
+        # The first filter gets error_rate * (1 - tightening) so that the geometric
+        # series of tighter filters sums to at most error_rate.
+        self.filters = [_BloomFilter(self.capacity, self.error_rate * (1 - self.tightening))]
+
+    def _load(self):
+        with open(self.save_file, "rb") as save:
+            data = save.read()
+        count, false_positives, negatives, filter_count = _HEADER.unpack_from(data, 0)
+        offset = _HEADER.size
+        filters = list()
+        for _ in range(filter_count):
+            capacity, items, hash_count, bits, error_rate = _FILTER.unpack_from(data, offset)
+            offset += _FILTER.size
+            size = (bits + 7) // 8
+            if offset + size > len(data):
+                raise ValueError(f"Truncated bloom filter in {self.save_file}")
+            filters.append(_BloomFilter(capacity, error_rate, items, hash_count, bits, bytearray(data[offset:offset + size])))
+            offset += size
+        if not filters:
+            raise ValueError(f"Empty bloom filter in {self.save_file}")
+        self.count, self.false_positives, self.negatives, self.filters = count, false_positives, negatives, filters
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        with self.lock:
+            self._reset()
+
+    @staticmethod
+    def _hashes(urlhash):
+        digest = bytes.fromhex(urlhash)
+        return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:16], "little") | 1
+
+    def __contains__(self, urlhash):
+        h1, h2 = self._hashes(urlhash)
+        with self.lock:
+            for bloom in reversed(self.filters):
+                if bloom.contains(h1, h2):
+                    return True
+            self.negatives += 1
+            return False
+
+    def add(self, urlhash):
+        ''' Adds a key the caller knows is new. '''
+        h1, h2 = self._hashes(urlhash)
+        with self.lock:
+            bloom = self.filters[-1]
+            if bloom.items >= bloom.capacity:
+                bloom = _BloomFilter(bloom.capacity * self.growth, bloom.error_rate * self.tightening)
+                self.filters.append(bloom)
+            bloom.add(h1, h2)
+            self.count += 1
+
+    def false_positive(self):
+        ''' Records that a "maybe" answer turned out to be wrong. '''
+        with self.lock:
+            self.false_positives += 1
+
+    def estimated_error_rate(self):
+        with self.lock:
+            return 1 - math.prod(1 - bloom.estimated_error_rate() for bloom in self.filters)
+
+    def observed_error_rate(self):
+        ''' False positives over every lookup of a key that had not been added. '''
+        with self.lock:
+            lookups = self.false_positives + self.negatives
+            return self.false_positives / lookups if lookups else 0.0
+
+    def memory(self):
+        with self.lock:
+            return sum(len(bloom.data) for bloom in self.filters)
+
+    def save(self):
+        with self.lock:
+            with atomic_write(self.save_file) as save:
+                save.write(_HEADER.pack(self.count, self.false_positives, self.negatives, len(self.filters)))
+                for bloom in self.filters:
+                    save.write(_FILTER.pack(bloom.capacity, bloom.items, bloom.hash_count, bloom.bits, bloom.error_rate))
+                    save.write(bloom.data)
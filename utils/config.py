@@ -8,12 +8,76 @@ class Config(object):
         assert self.user_agent != "DEFAULT AGENT", "Set useragent in config.ini"
         assert re.match(r"^[a-zA-Z0-9_ ,]+$", self.user_agent), "User agent should not have any special characters outside '_', ',' and 'space'"
         self.threads_count = int(config["LOCAL PROPERTIES"]["THREADCOUNT"])
+        self.engine = config.get("LOCAL PROPERTIES", "ENGINE", fallback="threads")
+        self.max_in_flight = config.getint("LOCAL PROPERTIES", "MAXINFLIGHT", fallback=200)
+        self.parser_processes = config.getint("LOCAL PROPERTIES", "PARSERPROCESSES", fallback=0)
+        self.shards = config.getint("LOCAL PROPERTIES", "SHARDS", fallback=1)
         self.save_file = config["LOCAL PROPERTIES"]["SAVE"]
+        self.page_store = config.get("LOCAL PROPERTIES", "PAGESTORE", fallback="data")
+        self.journal_file = config.get("LOCAL PROPERTIES", "JOURNAL", fallback=f"{self.save_file}.journal")
+        self.journal_batch_size = config.getint("LOCAL PROPERTIES", "JOURNALBATCH", fallback=500)
+        self.journal_flush_interval = config.getfloat("LOCAL PROPERTIES", "JOURNALFLUSHINTERVAL", fallback=1.0)
+        self.journal_compact_size = config.getint("LOCAL PROPERTIES", "JOURNALCOMPACT", fallback=50000)
+        self.pending_file = config.get("LOCAL PROPERTIES", "PENDING", fallback=f"{self.save_file}.pending")
+        self.seen_file = config.get("LOCAL PROPERTIES", "SEEN", fallback=f"{self.save_file}.bloom")
+        self.seen_capacity = config.getint("LOCAL PROPERTIES", "SEENCAPACITY", fallback=1000000)
+        self.seen_error_rate = config.getfloat("LOCAL PROPERTIES", "SEENERRORRATE", fallback=0.001)
 
         self.host = config["CONNECTION"]["HOST"]
         self.port = int(config["CONNECTION"]["PORT"])
+        self.connect_timeout = config.getfloat("CONNECTION", "CONNECTTIMEOUT", fallback=5)
+        self.read_timeout = config.getfloat("CONNECTION", "READTIMEOUT", fallback=30)
+        self.download_retries = config.getint("CONNECTION", "RETRIES", fallback=3)
+        self.download_backoff = config.getfloat("CONNECTION", "BACKOFF", fallback=0.5)
+        self.download_max_backoff = config.getfloat("CONNECTION", "MAXBACKOFF", fallback=8)
 
         self.seed_urls = config["CRAWLER"]["SEEDURL"].split(",")
         self.time_delay = float(config["CRAWLER"]["POLITENESS"])
+        self.extractor = config.get("CRAWLER", "EXTRACTOR", fallback="soup")
+        assert self.extractor in ("soup", "fast"), "EXTRACTOR should be soup or fast"
+        self.frontier = config.get("CRAWLER", "FRONTIER", fallback="lifo")
+        assert self.frontier in ("lifo", "priority"), "FRONTIER should be lifo or priority"
+        self.priority_depth_weight = config.getfloat("PRIORITY", "DEPTHWEIGHT", fallback=0.1)
+        self.priority_inlink_weight = config.getfloat("PRIORITY", "INLINKWEIGHT", fallback=0.25)
+        self.priority_yield_weight = config.getfloat("PRIORITY", "YIELDWEIGHT", fallback=1.0)
 
-        self.cache_server = None
\ No newline at end of file
+        # Optional sections fall back to defaults so older config files keep working.
+        self.fingerprint_file = config.get("DUPLICATES", "FINGERPRINTS", fallback="data.fingerprints")
+        self.near_index_file = config.get("DUPLICATES", "NEARINDEX", fallback="data.minhash")
+        self.near_threshold = config.getfloat("DUPLICATES", "NEARTHRESHOLD", fallback=0.9)
+        self.minhash_slots = config.getint(
+            "DUPLICATES", "MINHASHSLOTS", fallback=config.getint("DUPLICATES", "MINHASHPERMUTATIONS", fallback=128))
+        self.lsh_bands = config.getint("DUPLICATES", "LSHBANDS", fallback=16)
+
+        self.robots_file = config.get("ROBOTS", "SAVE", fallback="robots.shelve")
+        self.robots_cache_size = config.getint("ROBOTS", "CACHESIZE", fallback=1024)
+        self.robots_ttl = config.getfloat("ROBOTS", "TTL", fallback=86400)
+        self.robots_negative_ttl = config.getfloat("ROBOTS", "NEGATIVETTL", fallback=3600)
+        self.robots_timeout = config.getfloat("ROBOTS", "TIMEOUT", fallback=10)
+
+        self.traps_enabled = config.getboolean("TRAPS", "ENABLED", fallback=True)
+        self.trap_window = config.getint("TRAPS", "WINDOW", fallback=50)
+        self.trap_min_samples = config.getint("TRAPS", "MINSAMPLES", fallback=20)
+        self.trap_throttle_yield = config.getfloat("TRAPS", "THROTTLEYIELD", fallback=0.2)
+        self.trap_throttle_every = config.getint("TRAPS", "THROTTLEEVERY", fallback=10)
+        self.trap_stop_yield = config.getfloat("TRAPS", "STOPYIELD", fallback=0.05)
+        self.trap_max_templates = config.getint("TRAPS", "MAXTEMPLATES", fallback=1000)
+
+        self.recrawl_enabled = config.getboolean("RECRAWL", "ENABLED", fallback=False)
+        self.revisit_file = config.get("RECRAWL", "SAVE", fallback="data.revisits")
+        self.revisit_initial_interval = config.getfloat("RECRAWL", "INITIALINTERVAL", fallback=86400)
+        self.revisit_min_interval = config.getfloat("RECRAWL", "MININTERVAL", fallback=3600)
+        self.revisit_max_interval = config.getfloat("RECRAWL", "MAXINTERVAL", fallback=30 * 86400)
+        # Set by launch.py --recrawl: queue the downloaded pages that are due for a revisit.
+        self.recrawl = False
+
+        self.report_file = config.get("REPORT", "SAVE", fallback="report.pickle")
+        self.report_save_every = config.getint("REPORT", "SAVEEVERY", fallback=100)
+
+        self.metrics_enabled = config.getboolean("METRICS", "ENABLED", fallback=False)
+        self.metrics_file = config.get("METRICS", "SAVE", fallback="metrics.json")
+        self.metrics_interval = config.getfloat("METRICS", "INTERVAL", fallback=10)
+        self.metrics_port = config.getint("METRICS", "PORT", fallback=0)
+        self.metrics_samples = config.getint("METRICS", "SAMPLES", fallback=1024)
+
+        self.cache_server = None
@@ -1,21 +1,67 @@
 import requests
 import cbor
 import time
+import random
+
+from itertools import count
+from threading import local
+from requests.adapters import HTTPAdapter
 
 from utils.response import Response
 
+# One keep-alive session per thread (requests sessions are not thread safe),
+# and one counter shared by every thread to round-robin the cache servers.
+_sessions = local()
+_next_address = count()
+
+def cache_server_addresses(cache_server):
+    ''' The load balancer is either one (host, port) pair or a tuple of them. '''
+    if cache_server and all(isinstance(address, (tuple, list)) for address in cache_server):
+        return [tuple(address) for address in cache_server]
+    return [tuple(cache_server)]
+
+def get_session(config):
+    session = getattr(_sessions, "session", None)
+    if session is None:
+        pool_size = len(cache_server_addresses(config.cache_server))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        _sessions.session = session
+    return session
+
 def download(url, config, logger=None):
-    host, port = config.cache_server
-    resp = requests.get(
-        f"http://{host}:{port}/",
-        params=[("q", f"{url}"), ("u", f"{config.user_agent}")])
+    addresses = cache_server_addresses(config.cache_server)
+    session = get_session(config)
+    resp, error = None, None
+    for attempt in range(config.download_retries + 1):
+        if attempt:
+            # Exponential backoff with jitter so retrying workers do not move in lockstep.
+            delay = min(config.download_backoff * 2 ** (attempt - 1), config.download_max_backoff)
+            time.sleep(delay * random.uniform(0.5, 1.5))
+        host, port = addresses[next(_next_address) % len(addresses)]
+        try:
+            resp = session.get(
+                f"http://{host}:{port}/",
+                params=[("q", f"{url}"), ("u", f"{config.user_agent}")],
+                timeout=(config.connect_timeout, config.read_timeout))
+        except (requests.ConnectionError, requests.Timeout) as e:
+            resp, error = None, e
+            continue
+        if resp.status_code < 500:
+            break
     try:
         if resp and resp.content:
             return Response(cbor.loads(resp.content))
     except (EOFError, ValueError) as e:
         pass
-    logger.error(f"Spacetime Response error {resp} with url {url}.")
+    if resp is None:
+        message = f"Spacetime connection error {error!r} with url {url}."
+    else:
+        message = f"Spacetime Response error {resp} with url {url}."
+    if logger:
+        logger.error(message)
     return Response({
-        "error": f"Spacetime Response error {resp} with url {url}.",
-        "status": resp.status_code,
+        "error": message,
+        "status": resp.status_code if resp is not None else None,
         "url": url})
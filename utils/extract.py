@@ -0,0 +1,81 @@
+from lxml import etree
+from bs4.dammit import EncodingDetector
+
+# Elements whose text and links extract_next_links drops from the BeautifulSoup tree.
+SKIPPED_TAGS = frozenset(["script", "style", "head", "title", "meta"])
+# Elements whose text BeautifulSoup keeps apart from the page's strings
+# (TemplateString, RubyTextString...), so get_text() leaves it out; the
+# anchors inside them are still found by find_all('a').
+TEXTLESS_TAGS = frozenset(["template", "rt", "rp"])
+
+
+class _PageTarget(object):
+    ''' lxml parser target that keeps visible text and anchor hrefs.
+
+    Text between two parser events is joined before being stripped, the
+    same way BeautifulSoup builds its strings, so the output matches
+    soup.get_text(" ", strip=True) and soup.find_all('a'). '''
+
+    def __init__(self):
+        self.strings = list()
+        self.hrefs = list()
+        self.pending = list()
+        self.skip_depth = 0 # > 0 while inside a skipped element
+        self.textless_depth = 0 # > 0 while inside a textless element
+
+    def _end_string(self):
+        if self.pending:
+            string = "".join(self.pending).strip()
+            if string:
+                self.strings.append(string)
+            self.pending = list()
+
+    def start(self, tag, attrib):
+        self._end_string()
+        if self.skip_depth or tag in SKIPPED_TAGS:
+            self.skip_depth += 1
+            return
+        if self.textless_depth or tag in TEXTLESS_TAGS:
+            self.textless_depth += 1
+        if tag == "a":
+            self.hrefs.append(attrib.get("href"))
+
+    def end(self, tag):
+        self._end_string()
+        if self.skip_depth:
+            self.skip_depth -= 1
+        elif self.textless_depth:
+            self.textless_depth -= 1
+
+    def data(self, data):
+        if not self.skip_depth and not self.textless_depth:
+            self.pending.append(data)
+
+    def comment(self, text):
+        self._end_string()
+
+    def pi(self, target, data=None):
+        self._end_string()
+
+    def doctype(self, *args):
+        self._end_string()
+
+    def close(self):
+        self._end_string()
+
+
+def extract_text_and_links(content):
+    ''' Single streaming pass over the html: returns the visible text joined
+    by spaces and the href of every anchor (None when missing), in document
+    order. Encodings are tried in the same order BeautifulSoup tries them. '''
+    detector = EncodingDetector(content, is_html=True)
+    for encoding in detector.encodings:
+        target = _PageTarget()
+        parser = etree.HTMLParser(target=target, strip_cdata=False, recover=True, encoding=encoding)
+        try:
+            parser.feed(detector.markup)
+            parser.close()
+        except (UnicodeDecodeError, LookupError, etree.ParserError):
+            continue
+        return " ".join(target.strings), target.hrefs
+    return "", list()
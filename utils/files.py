@@ -0,0 +1,96 @@
+import os
+
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path, mode="wb", **kwargs):
+    ''' Opens a temporary file next to path that replaces path only once the
+    block completes, so a crash never leaves a torn file behind. '''
+    with open(f"{path}.tmp", mode, **kwargs) as file:
+        yield file
+    os.replace(f"{path}.tmp", path)
+
+
+class RecordLog(object):
+    ''' Append-only file of fixed-width records, each starting with a key of
+    key_size bytes. A later record of a key supersedes the earlier ones; only
+    the number of the latest is kept in memory and records are read back
+    with pread.
+
+    load() replays the file once at startup: a record torn by a crash is
+    dropped, and a file holding more than twice as many records as keys is
+    compacted down to the latest record of each key. Not thread-safe on its
+    own; callers hold their own lock. '''
+
+    def __init__(self, save_file, record_size, key_size=32):
+        self.save_file = save_file
+        self.record_size = record_size
+        self.key_size = key_size
+        self.index = dict() # raw key -> record number of its latest record
+        self.records = 0
+        self.save = None
+        self.reader = None
+
+    def load(self):
+        ''' Replays and opens the file. Returns the latest record of every key. '''
+        latest = list()
+        if os.path.exists(self.save_file):
+            with open(self.save_file, "rb") as save:
+                data = save.read()
+            size = self.record_size
+            self.records = len(data) // size
+            for number in range(self.records):
+                self.index[data[number * size:number * size + self.key_size]] = number
+            latest = [data[number * size:(number + 1) * size] for number in sorted(self.index.values())]
+            if self.records > 2 * len(self.index):
+                self._compact(latest)
+            elif self.records * size != len(data):
+                with open(self.save_file, "r+b") as save:
+                    save.truncate(self.records * size)
+        self.save = open(self.save_file, "ab")
+        self.reader = open(self.save_file, "rb")
+        return latest
+
+    def _compact(self, latest):
+        with atomic_write(self.save_file) as save:
+            save.writelines(latest)
+        self.index = {record[:self.key_size]: number for number, record in enumerate(latest)}
+        self.records = len(latest)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def get(self, key):
+        ''' The latest record of key, or None. '''
+        number = self.index.get(key)
+        if number is None:
+            return None
+        return os.pread(self.reader.fileno(), self.record_size, number * self.record_size)
+
+    def append(self, record):
+        self.save.write(record)
+        self.save.flush()
+        self.index[record[:self.key_size]] = self.records
+        self.records += 1
+
+    def latest(self):
+        ''' The latest record of every key as of this call, in one sequential read. '''
+        self.save.flush()
+        records = self.records
+        index = dict(self.index)
+        return self._scan(records, index)
+
+    def _scan(self, records, index):
+        with open(self.save_file, "rb") as save:
+            for number in range(records):
+                record = save.read(self.record_size)
+                if index.get(record[:self.key_size]) == number:
+                    yield record
+
+    def close(self):
+        self.save.close()
+        self.reader.close()
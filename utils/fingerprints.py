@@ -0,0 +1,91 @@
+import os
+
+from threading import RLock
+
+
+class FingerprintIndex(object):
+    ''' Set of fixed-width digests kept in one open-addressed bytearray.
+
+    Every digest is stored inline in its slot, so a million MD5 fingerprints
+    take a few dozen megabytes instead of a set of hex strings. New digests are
+    appended to save_file, which is replayed once at startup. '''
+
+    def __init__(self, save_file, width=16, capacity=1 << 16):
+        self.save_file = save_file
+        self.width = width
+        self.empty = bytes(width)
+        self.lock = RLock()
+        self.count = 0
+        self.has_empty = False # An all-zero digest cannot live in the table, it marks free slots.
+        self._allocate(capacity)
+        if os.path.exists(self.save_file):
+            with open(self.save_file, "rb") as save:
+                data = save.read()
+            # A torn record at the end of the file (crash mid-append) is dropped.
+            for offset in range(0, len(data) - len(data) % width, width):
+                self._insert(data[offset:offset + width])
+        self.save = open(self.save_file, "ab")
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, digest):
+        if digest == self.empty:
+            return self.has_empty
+        with self.lock:
+            return self._find(digest)[1]
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self.mask = capacity - 1
+        self.table = bytearray(capacity * self.width)
+
+    def _find(self, digest):
+        # Linear probing from the slot picked by the digest's own leading bytes.
+        width = self.width
+        slot = int.from_bytes(digest[:8], "little") & self.mask
+        while True:
+            stored = self.table[slot * width:(slot + 1) * width]
+            if stored == digest:
+                return slot, True
+            if stored == self.empty:
+                return slot, False
+            slot = (slot + 1) & self.mask
+
+    def _insert(self, digest):
+        if digest == self.empty:
+            added = not self.has_empty
+            self.has_empty = True
+        else:
+            slot, found = self._find(digest)
+            added = not found
+            if added:
+                self.table[slot * self.width:(slot + 1) * self.width] = digest
+        if added:
+            self.count += 1
+            if self.count * 2 > self.capacity: # Keep the load factor under 0.5 so probes stay short.
+                self._grow()
+        return added
+
+    def _grow(self):
+        old, width = self.table, self.width
+        self._allocate(self.capacity * 2)
+        for offset in range(0, len(old), width):
+            digest = old[offset:offset + width]
+            if digest != self.empty:
+                slot = self._find(digest)[0]
+                self.table[slot * width:(slot + 1) * width] = digest
+
+    def add(self, digest):
+        ''' Adds digest and persists it. Returns False if it was already present. '''
+        assert len(digest) == self.width, f"Fingerprints must be {self.width} bytes long"
+        with self.lock:
+            if not self._insert(bytes(digest)):
+                return False
+            self.save.write(digest)
+            self.save.flush()
+            return True
+
+    def close(self):
+        with self.lock:
+            self.save.close()
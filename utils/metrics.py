@@ -0,0 +1,196 @@
+import json
+import time
+
+from collections import Counter, deque
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread, RLock, Event
+
+from utils import get_logger
+from utils.files import atomic_write
+
+
+class Metrics(object):
+    ''' Stage timers, counters and gauges for the crawl loop.
+
+    time(stage) records how long a block took; each stage keeps its count,
+    total and maximum plus the last `samples` durations, from which p50 and
+    p99 are taken. count(name) bumps a counter (e.g. rejection reasons) and
+    gauge(name, function) registers a value read at snapshot time (e.g. the
+    frontier's queue depth). A snapshot is written as JSON to snapshot_file
+    every interval seconds and, if port is set, served on
+    http://127.0.0.1:port/metrics. '''
+
+    def __init__(self, snapshot_file="metrics.json", interval=10, port=0, samples=1024):
+        self.logger = get_logger("METRICS")
+        self.snapshot_file = snapshot_file
+        self.interval = interval
+        self.port = port
+        self.samples = samples
+        self.lock = RLock()
+        self.stages = dict() # stage -> [count, total seconds, max seconds, deque of recent seconds]
+        self.counters = Counter()
+        self.gauges = dict() # name -> function returning a json-serializable value
+        self.started = time.time()
+        self.last_pages = (self.started, 0) # (time, pages) at the previous snapshot
+        self.stopped = Event()
+        self.server = None
+        self.writer = None
+
+    def start(self):
+        self.writer = Thread(target=self._write_periodically, daemon=True)
+        self.writer.start()
+        if self.port:
+            self.server = ThreadingHTTPServer(("127.0.0.1", self.port), _handler(self))
+            self.server.daemon_threads = True
+            Thread(target=self.server.serve_forever, daemon=True).start()
+            self.logger.info(f"Serving metrics on http://127.0.0.1:{self.server.server_port}/metrics")
+        return self
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            timer = self.stages.get(stage)
+            if timer is None:
+                timer = self.stages[stage] = [0, 0.0, 0.0, deque(maxlen=self.samples)]
+            timer[0] += 1
+            timer[1] += seconds
+            if seconds > timer[2]:
+                timer[2] = seconds
+            timer[3].append(seconds)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def gauge(self, name, function):
+        with self.lock:
+            self.gauges[name] = function
+
+    def snapshot(self):
+        now = time.time()
+        with self.lock:
+            stages = dict()
+            for stage, (count, total, longest, recent) in self.stages.items():
+                recent = sorted(recent)
+                stages[stage] = {
+                    "count": count, "total": total, "mean": total / count, "max": longest,
+                    "p50": _percentile(recent, 0.5), "p99": _percentile(recent, 0.99)}
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            pages = self.counters["pages"]
+            last_time, last_pages = self.last_pages
+            self.last_pages = (now, pages)
+        values = dict()
+        for name, function in gauges.items():
+            try:
+                values[name] = function()
+            except Exception as err:
+                values[name] = f"error: {err}"
+        return {
+            "time": now, "uptime": now - self.started,
+            "pages_per_second": pages / (now - self.started) if now > self.started else 0.0,
+            "recent_pages_per_second": (pages - last_pages) / (now - last_time) if now > last_time else 0.0,
+            "stages": stages, "counters": counters, "gauges": values}
+
+    def save(self):
+        snapshot = self.snapshot()
+        with atomic_write(self.snapshot_file, "w", encoding="utf-8") as save:
+            json.dump(snapshot, save, indent=1, sort_keys=True)
+
+    def _write_periodically(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.save()
+            except OSError as err:
+                self.logger.error(f"Could not write {self.snapshot_file}: {err}")
+
+    def close(self):
+        self.stopped.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        self.save()
+
+
+class NullMetrics(object):
+    ''' Stands in for Metrics when METRICS is disabled: every call is a no-op,
+    so instrumented code pays one method call per measurement. '''
+
+    class _NullTimer(object):
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            return False
+
+    _timer = _NullTimer()
+
+    def start(self):
+        return self
+
+    def time(self, stage):
+        return self._timer
+
+    def observe(self, stage, seconds):
+        pass
+
+    def count(self, name, amount=1):
+        pass
+
+    def gauge(self, name, function):
+        pass
+
+    def close(self):
+        pass
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def _handler(metrics):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") not in ("", "/metrics"):
+                self.send_error(404)
+                return
+            body = json.dumps(metrics.snapshot(), sort_keys=True).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass # Polling the endpoint should not flood the crawler's output.
+    return MetricsHandler
+
+
+metrics = NullMetrics()
+
+def init(config):
+    ''' Replaces the shared metrics with a running Metrics if METRICS is enabled. '''
+    global metrics
+    metrics.close()
+    if config.metrics_enabled:
+        metrics = Metrics(
+            config.metrics_file, interval=config.metrics_interval,
+            port=config.metrics_port, samples=config.metrics_samples).start()
+    else:
+        metrics = NullMetrics()
+    return metrics
+
+def close():
+    metrics.close()
+
+def get_metrics():
+    return metrics
@@ -0,0 +1,123 @@
+from array import array
+from collections import defaultdict
+from hashlib import blake2b
+from threading import RLock
+
+from utils.files import RecordLog
+
+# Value of a signature slot that no token fell into.
+_EMPTY = (1 << 64) - 1
+
+def _hash(data, key):
+    # blake2b rather than hash(), which is salted per process.
+    return int.from_bytes(blake2b(data, digest_size=8, key=key).digest(), "little")
+
+def minhash_signature(tokens, slots, key=b""):
+    ''' One-permutation MinHash: each token is hashed once, the hash picks
+    one of `slots` slots, and every slot keeps the smallest hash it gets. A
+    slot no token fell into copies the first filled slot of its own probe
+    sequence (optimal densification), so two pages agree on any slot with a
+    probability equal to the Jaccard similarity of their token sets, as with
+    `slots` independent permutations. '''
+    signature = array('Q', [_EMPTY]) * slots
+    for token in tokens:
+        value = _hash(token.encode(), key)
+        slot = value % slots
+        if value < signature[slot]:
+            signature[slot] = value
+    filled = array('Q', signature)
+    if _EMPTY in filled and any(value != _EMPTY for value in filled):
+        for slot in range(slots):
+            attempt = 0
+            while signature[slot] == _EMPTY:
+                attempt += 1
+                signature[slot] = filled[_hash(f"{slot}:{attempt}".encode(), key) % slots]
+    return signature
+
+
+class NearDuplicateIndex(object):
+    ''' MinHash signatures bucketed by LSH bands.
+
+    Only pages that share at least one band with the query are compared, so a
+    lookup costs a handful of candidates instead of a scan over every page.
+    Candidates are confirmed with the exact Jaccard ratio of their token sets,
+    which keeps the same threshold semantics as the brute-force check.
+
+    Keys are urlhashes. Each add appends the raw urlhash and the signature
+    to save_file, a RecordLog replayed once at startup. '''
+
+    def __init__(self, save_file, threshold=0.9, slots=128, bands=16, seed=1):
+        assert slots % bands == 0, "MINHASHSLOTS must be a multiple of LSHBANDS"
+        self.save_file = save_file
+        self.threshold = threshold
+        self.slots = slots
+        self.bands = bands
+        self.rows = slots // bands
+        self.key = str(seed).encode() # Fixed seed so signatures stay comparable across restarts.
+        self.buckets = defaultdict(list) # (band, band bytes) -> [page key, ...]
+        self.lock = RLock()
+        self.log = RecordLog(save_file, 32 + 8 * slots)
+        for record in self.log.load():
+            self._bucket(record[:32].hex(), array('Q', record[32:]))
+
+    def __len__(self):
+        return len(self.log)
+
+    def __contains__(self, key):
+        return bytes.fromhex(key) in self.log
+
+    def signature(self, tokens):
+        return minhash_signature(tokens, self.slots, self.key)
+
+    def _bands(self, signature):
+        for band in range(self.bands):
+            yield (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+
+    def _bucket(self, key, signature):
+        for band_key in self._bands(signature):
+            self.buckets[band_key].append(key)
+
+    def candidates(self, signature):
+        found = set()
+        with self.lock:
+            for band_key in self._bands(signature):
+                found.update(self.buckets.get(band_key, ()))
+        return found
+
+    def find(self, signature, tokens, lookup, size=None, exclude=None):
+        ''' Returns the key of a stored page whose token set is at least
+        threshold-similar to tokens, or None. lookup(key) must return the
+        stored token set of a candidate (or None if it is gone). size is the
+        number of distinct tokens on the page when tokens leaves some out
+        (e.g. tokens no stored page has). exclude is a key not to compare
+        with, e.g. the earlier version of a recrawled page. '''
+        tokens = set(tokens)
+        size = size if size is not None else len(tokens)
+        for key in self.candidates(signature):
+            if key == exclude:
+                continue
+            other = lookup(key)
+            if other is None:
+                continue
+            shared = len(tokens & other)
+            union = size + len(other) - shared
+            if union and shared / union >= self.threshold:
+                return key
+        return None
+
+    def add(self, key, signature):
+        # A key added again (a recrawled page that changed) replaces its old signature.
+        with self.lock:
+            record = self.log.get(bytes.fromhex(key))
+            if record is not None:
+                old = array('Q', record[32:])
+                if old == signature:
+                    return
+                for band_key in self._bands(old):
+                    self.buckets[band_key].remove(key)
+            self.log.append(bytes.fromhex(key) + signature.tobytes())
+            self._bucket(key, signature)
+
+    def close(self):
+        with self.lock:
+            self.log.close()
\ No newline at end of file
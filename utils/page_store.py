@@ -0,0 +1,174 @@
+import os
+import struct
+
+from array import array
+from collections import namedtuple
+from threading import RLock
+
+# urlhash, text md5, outlinks, words, terms offset, terms count, url offset, url length
+_RECORD = struct.Struct("<32s16sIIQIQI")
+
+PageRecord = namedtuple("PageRecord", ["page_id", "urlhash", "url", "outlinks", "words", "text_hash"])
+
+
+class PageStore(object):
+    ''' Append-only store of crawled pages, replacing data.shelve.
+
+    Tokens are interned to integer ids (prefix.vocab, one token per line).
+    Each page's term counts are a run of (id, count) uint32 pairs in
+    prefix.terms, and its url is a slice of prefix.urls. Everything else
+    about a page is one fixed-width record in prefix.pages, written last so
+    that a crash mid-write leaves the page out entirely. Reads use pread and
+    never unpickle anything. Writes go through add(), which holds a lock, so
+    several workers can share one store. Storing a url again supersedes its
+    earlier record. '''
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.lock = RLock()
+        self.token_ids = dict() # token -> id
+        self.tokens = list() # id -> token
+        self.index = dict() # raw urlhash -> page id of its latest record
+        self.records = 0
+        self._load_vocab()
+        self.vocab = open(f"{prefix}.vocab", "ab")
+        self.terms = open(f"{prefix}.terms", "ab")
+        self.urls = open(f"{prefix}.urls", "ab")
+        self.pages = open(f"{prefix}.pages", "ab")
+        self._load_pages()
+        # Separate read handles, used only through pread so readers never share a file position.
+        self.readers = {name: open(f"{prefix}.{name}", "rb") for name in ("terms", "urls", "pages")}
+
+    def _load_vocab(self):
+        path = f"{self.prefix}.vocab"
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as vocab:
+            data = vocab.read()
+        complete = data.rfind(b"\n") + 1
+        if complete != len(data):
+            # Drop a token whose line was torn by a crash.
+            with open(path, "r+b") as vocab:
+                vocab.truncate(complete)
+        for token in data[:complete].decode("utf-8").split("\n")[:-1]:
+            self.token_ids[token] = len(self.tokens)
+            self.tokens.append(token)
+
+    def _load_pages(self):
+        # One sequential read of the fixed-width records rebuilds the url index.
+        self.terms_size = os.path.getsize(f"{self.prefix}.terms") // 8
+        self.terms.truncate(self.terms_size * 8) # Drops half a pair torn by a crash.
+        self.urls_size = os.path.getsize(f"{self.prefix}.urls")
+        with open(f"{self.prefix}.pages", "rb") as pages:
+            data = pages.read()
+        size = _RECORD.size
+        for page_id in range(len(data) // size):
+            record = _RECORD.unpack_from(data, page_id * size)
+            if record[4] + record[5] > self.terms_size or record[6] + record[7] > self.urls_size:
+                break
+            self.index[record[0]] = page_id
+            self.records = page_id + 1
+        if self.records * size != len(data):
+            self.pages.truncate(self.records * size)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, urlhash):
+        return bytes.fromhex(urlhash) in self.index
+
+    def add(self, urlhash, url, outlinks, token_frequency, text_hash):
+        ''' Stores a page and returns its page id. '''
+        with self.lock:
+            new_tokens = list()
+            pairs = array("I")
+            for token, count in token_frequency.items():
+                token_id = self.token_ids.get(token)
+                if token_id is None:
+                    token_id = self.token_ids[token] = len(self.tokens)
+                    self.tokens.append(token)
+                    new_tokens.append(token)
+                pairs.append(token_id)
+                pairs.append(count)
+            if new_tokens:
+                self.vocab.write("".join(f"{token}\n" for token in new_tokens).encode("utf-8"))
+                self.vocab.flush()
+            url_bytes = url.encode("utf-8")
+            record = _RECORD.pack(
+                bytes.fromhex(urlhash), bytes.fromhex(text_hash), outlinks,
+                sum(token_frequency.values()), self.terms_size, len(pairs) // 2,
+                self.urls_size, len(url_bytes))
+            self.terms.write(pairs.tobytes())
+            self.urls.write(url_bytes)
+            self.terms.flush()
+            self.urls.flush()
+            self.pages.write(record)
+            self.pages.flush()
+            self.terms_size += len(pairs) // 2
+            self.urls_size += len(url_bytes)
+            page_id = self.records
+            self.records += 1
+            self.index[bytes.fromhex(urlhash)] = page_id
+            return page_id
+
+    def _read(self, name, offset, length):
+        return os.pread(self.readers[name].fileno(), length, offset)
+
+    def _record(self, page_id):
+        record = _RECORD.unpack(self._read("pages", page_id * _RECORD.size, _RECORD.size))
+        url = self._read("urls", record[6], record[7]).decode("utf-8")
+        return PageRecord(page_id, record[0].hex(), url, record[2], record[3], record[1].hex()), record
+
+    def get(self, urlhash):
+        page_id = self.index.get(bytes.fromhex(urlhash))
+        return self._record(page_id)[0] if page_id is not None else None
+
+    def _pairs(self, record):
+        pairs = array("I")
+        pairs.frombytes(self._read("terms", record[4] * 8, record[5] * 8))
+        return pairs
+
+    def term_ids(self, urlhash):
+        ''' Set of token ids on a page, or None if it is not stored. '''
+        page_id = self.index.get(bytes.fromhex(urlhash))
+        if page_id is None:
+            return None
+        return set(self._pairs(self._record(page_id)[1])[0::2])
+
+    def ids_of(self, tokens):
+        ''' Ids of the tokens that appear on some stored page. '''
+        with self.lock:
+            return {self.token_ids[token] for token in tokens if token in self.token_ids}
+
+    def token_frequency(self, urlhash):
+        page_id = self.index.get(bytes.fromhex(urlhash))
+        if page_id is None:
+            return None
+        pairs = self._pairs(self._record(page_id)[1])
+        return {self.tokens[token_id]: count for token_id, count in zip(pairs[0::2], pairs[1::2])}
+
+    def scan(self, with_terms=False):
+        ''' Streams (PageRecord, token frequency or None) for every live page,
+        reading each file sequentially once. '''
+        with self.lock:
+            records = self.records
+        with open(f"{self.prefix}.pages", "rb") as pages, open(f"{self.prefix}.urls", "rb") as urls, \
+                open(f"{self.prefix}.terms", "rb") as terms:
+            for page_id in range(records):
+                record = _RECORD.unpack(pages.read(_RECORD.size))
+                if self.index.get(record[0]) != page_id:
+                    continue # Superseded by a later record of the same url.
+                urls.seek(record[6])
+                url = urls.read(record[7]).decode("utf-8")
+                token_frequency = None
+                if with_terms:
+                    pairs = array("I")
+                    terms.seek(record[4] * 8)
+                    pairs.frombytes(terms.read(record[5] * 8))
+                    token_frequency = {self.tokens[token_id]: count for token_id, count in zip(pairs[0::2], pairs[1::2])}
+                yield PageRecord(page_id, record[0].hex(), url, record[2], record[3], record[1].hex()), token_frequency
+
+    def close(self):
+        with self.lock:
+            for data in (self.vocab, self.terms, self.urls, self.pages, *self.readers.values()):
+                data.close()
@@ -0,0 +1,102 @@
+import os
+import pickle
+
+from collections import Counter
+from threading import RLock
+from urllib.parse import urlparse
+
+from utils.files import atomic_write
+
+
+class ReportAggregator(object):
+    ''' Running totals behind the crawl report, updated as each page is stored.
+
+    Keeps global term counts, document frequencies, the longest page and the
+    number of unique pages per ics.uci.edu subdomain. The totals are pickled
+    to save_file every save_every pages and on close; the file also records
+    how many pages it covers, so a stale snapshot (e.g. after a crash) can be
+    detected and rebuilt from the data store in one pass. '''
+
+    def __init__(self, save_file, save_every=100):
+        self.save_file = save_file
+        self.save_every = save_every
+        self.lock = RLock()
+        self.unsaved = 0
+        self._reset()
+        if os.path.exists(self.save_file):
+            with open(self.save_file, "rb") as save:
+                self.__dict__.update(pickle.load(save))
+
+    def _reset(self):
+        self.pages = 0
+        self.term_counts = Counter()
+        self.document_frequency = Counter()
+        self.longest_page = (None, 0) # (url, number of words)
+        self.subdomain_pages = Counter() # hostname -> unique pages
+
+    def add_page(self, url, token_frequency):
+        with self.lock:
+            self._add(url, token_frequency)
+            self.unsaved += 1
+            if self.unsaved >= self.save_every:
+                self.save()
+
+    def _add(self, url, token_frequency):
+        # Counts a page without saving, so rebuild() saves once at the end.
+        with self.lock:
+            self.pages += 1
+            self.term_counts.update(token_frequency)
+            self.document_frequency.update(token_frequency.keys())
+            words = sum(token_frequency.values())
+            if words > self.longest_page[1]:
+                self.longest_page = (url, words)
+            hostname = urlparse(url).hostname
+            if hostname and hostname.endswith(".ics.uci.edu"):
+                self.subdomain_pages[hostname] += 1
+
+    def replace_page(self, url, old_token_frequency, token_frequency):
+        ''' Swaps the counts of a recrawled page's earlier version for the new
+        ones, so a changed page is not counted twice. If it was the longest
+        page and shrank, the longest page is only exact again after a rebuild. '''
+        with self.lock:
+            self.term_counts.subtract(old_token_frequency)
+            self.term_counts.update(token_frequency)
+            self.document_frequency.subtract(old_token_frequency.keys())
+            self.document_frequency.update(token_frequency.keys())
+            # Tokens the page no longer has may drop to zero.
+            for token in old_token_frequency:
+                for counts in (self.term_counts, self.document_frequency):
+                    if counts.get(token, 0) <= 0:
+                        counts.pop(token, None)
+            words = sum(token_frequency.values())
+            if words > self.longest_page[1] or url == self.longest_page[0]:
+                self.longest_page = (url, words)
+            self.unsaved += 1
+            if self.unsaved >= self.save_every:
+                self.save()
+
+    def rebuild(self, pages):
+        ''' Recomputes every total from an iterable of (url, token_frequency). '''
+        with self.lock:
+            self._reset()
+            for url, token_frequency in pages:
+                self._add(url, token_frequency)
+            self.save()
+
+    def save(self):
+        with self.lock:
+            state = {
+                "pages": self.pages, "term_counts": self.term_counts,
+                "document_frequency": self.document_frequency,
+                "longest_page": self.longest_page, "subdomain_pages": self.subdomain_pages}
+            with atomic_write(self.save_file) as save:
+                pickle.dump(state, save, protocol=pickle.HIGHEST_PROTOCOL)
+            self.unsaved = 0
+
+    def most_common_words(self, count=50):
+        with self.lock:
+            return self.term_counts.most_common(count)
+
+    def subdomains(self):
+        with self.lock:
+            return sorted(self.subdomain_pages.items())
@@ -1,14 +1,121 @@
 import pickle
 
+from utils.metrics import get_metrics
+
 class Response(object):
+    ''' Cache server response. The pickled requests response is only decoded
+    when raw_response is first read; status, payload_size, content_length
+    and content_type can usually be answered without decoding it. '''
+
     def __init__(self, resp_dict):
         self.url = resp_dict["url"]
         self.status = resp_dict["status"]
         self.error = resp_dict["error"] if "error" in resp_dict else None
-        try:
-            self.raw_response = (
-                pickle.loads(resp_dict["response"])
-                if "response" in resp_dict else
-                None)
-        except TypeError:
-            self.raw_response = None
+        self._payload = resp_dict["response"] if "response" in resp_dict else None
+        self._raw_response = None
+        self._decoded = False
+        self._sniffed = None
+
+    @property
+    def raw_response(self):
+        if not self._decoded:
+            try:
+                with get_metrics().time("decode"):
+                    self._raw_response = (
+                        pickle.loads(self._payload)
+                        if self._payload is not None else
+                        None)
+            except TypeError:
+                self._raw_response = None
+            self._payload = None # The decoded response holds its own copy of the body.
+            self._decoded = True
+        return self._raw_response
+
+    @property
+    def payload_size(self):
+        ''' Size of the still encoded response, an upper bound of the body size. '''
+        if self._decoded or not isinstance(self._payload, (bytes, bytearray)):
+            return None
+        return len(self._payload)
+
+    @property
+    def content_length(self):
+        ''' Length of the body in bytes, or None if there is no body. '''
+        if not self._decoded:
+            length, _ = self._sniff()
+            if length is not None:
+                return length
+        raw_response = self.raw_response
+        return len(raw_response.content) if raw_response is not None and raw_response.content is not None else None
+
+    @property
+    def content_type(self):
+        if not self._decoded:
+            _, content_type = self._sniff()
+            if content_type is not None:
+                return content_type
+        raw_response = self.raw_response
+        return raw_response.headers.get("Content-Type") if raw_response is not None else None
+
+    def _sniff(self):
+        # Reads the body length and Content-Type straight out of the pickle
+        # opcodes. Anything unexpected gives None and callers decode instead.
+        if self._sniffed is None:
+            self._sniffed = (None, None)
+            if isinstance(self._payload, (bytes, bytearray)):
+                try:
+                    self._sniffed = _sniff_pickled_response(self._payload)
+                except (IndexError, ValueError, UnicodeDecodeError):
+                    pass
+        return self._sniffed
+
+
+# Opcodes (protocol 3 and later) that can appear around a pickled requests.Response's
+# _content bytes and header strings: op -> width of its length (or argument) field.
+_STRING_OPS = {0x8c: 1, ord("X"): 4} # SHORT_BINUNICODE, BINUNICODE
+_BYTES_OPS = {ord("C"): 1, ord("B"): 4, 0x8e: 8} # SHORT_BINBYTES, BINBYTES, BINBYTES8
+_MEMO_OPS = {0x94: 0, ord("q"): 1, ord("r"): 4} # MEMOIZE, BINPUT, LONG_BINPUT
+_GET_OPS = {ord("h"): 1, ord("j"): 4} # BINGET, LONG_BINGET
+_VALUE_OPS = {**_STRING_OPS, **_BYTES_OPS, **_GET_OPS}
+
+def _find_string(payload, text, start=0):
+    # Position right after a string opcode holding exactly text, or -1.
+    encoded = text.encode("utf-8")
+    position = payload.find(encoded, start)
+    while position != -1:
+        for op, width in _STRING_OPS.items():
+            head = position - 1 - width
+            if head >= 0 and payload[head] == op and int.from_bytes(payload[head + 1:position], "little") == len(encoded):
+                return position + len(encoded)
+        position = payload.find(encoded, position + 1)
+    return -1
+
+def _next_op(payload, position):
+    # Skips memo opcodes and returns (op, argument length, argument start).
+    while payload[position] in _MEMO_OPS:
+        position += 1 + _MEMO_OPS[payload[position]]
+    op = payload[position]
+    width = _VALUE_OPS.get(op)
+    if width is None:
+        raise ValueError(f"Unexpected pickle opcode {op:#x}")
+    if op in _GET_OPS:
+        return op, 0, position + 1 + width
+    return op, int.from_bytes(payload[position + 1:position + 1 + width], "little"), position + 1 + width
+
+def _sniff_pickled_response(payload):
+    content_length, content_type = None, None
+    position = _find_string(payload, "_content")
+    if position == -1:
+        return None, None
+    op, length, start = _next_op(payload, position)
+    if op not in _BYTES_OPS:
+        return None, None
+    content_length = length
+    # Headers are pickled after the body: "content-type" -> ("Content-Type", value).
+    position = _find_string(payload, "content-type", start + length)
+    if position != -1:
+        op, length, start = _next_op(payload, position)
+        op, length, start = _next_op(payload, start + length)
+        if op in _STRING_OPS:
+            content_type = payload[start:start + length].decode("utf-8")
+    return content_length, content_type
@@ -0,0 +1,100 @@
+import time
+import struct
+
+from collections import namedtuple
+from threading import RLock
+
+from utils.files import RecordLog
+
+# urlhash, content md5, fetched at, revisit interval, fetches, changes
+_RECORD = struct.Struct("<32s16sddII")
+
+Revisit = namedtuple("Revisit", ["urlhash", "digest", "fetched_at", "interval", "fetches", "changes"])
+
+
+class RevisitStore(object):
+    ''' Fetch history of every page that got past the pre-parse filters,
+    used to tell unchanged pages apart and to schedule recrawls.
+
+    Each fetch appends one record to save_file, a RecordLog keyed by the raw
+    urlhash: the MD5 of the page's content, when it was fetched, how long to
+    wait before the next visit, and how many of its fetches found it changed.
+    The interval starts at initial_interval, halves whenever a revisit finds
+    the page changed and doubles whenever it does not, within
+    [min_interval, max_interval].
+
+    Only urls the frontier queued again for a revisit (queue) may be skipped
+    as unchanged. Any other fetch of a known url is a refetch after a crash
+    lost its completion, and its links have to be followed again. '''
+
+    def __init__(self, save_file, initial_interval=86400, min_interval=3600, max_interval=30 * 86400):
+        self.save_file = save_file
+        self.initial_interval = initial_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.lock = RLock()
+        self.queued = set() # urlhashes queued for a revisit and not fetched yet
+        self.log = RecordLog(save_file, _RECORD.size)
+        self.log.load()
+
+    def __len__(self):
+        return len(self.log)
+
+    def _unpack(self, record):
+        record = _RECORD.unpack(record)
+        return Revisit(record[0].hex(), record[1], *record[2:])
+
+    def get(self, urlhash):
+        with self.lock:
+            record = self.log.get(bytes.fromhex(urlhash))
+            return self._unpack(record) if record is not None else None
+
+    def observe(self, urlhash, digest, fetched_at=None):
+        ''' Records a fetch of urlhash whose content has MD5 digest. Returns
+        whether the content differs from the previous fetch (True for a
+        first fetch). '''
+        fetched_at = fetched_at if fetched_at is not None else time.time()
+        with self.lock:
+            previous = self.get(urlhash)
+            if previous is None:
+                changed, interval, fetches, changes = True, self.initial_interval, 1, 0
+            else:
+                changed = previous.digest != digest
+                interval = previous.interval / 2 if changed else previous.interval * 2
+                interval = min(max(interval, self.min_interval), self.max_interval)
+                fetches, changes = previous.fetches + 1, previous.changes + changed
+            self.log.append(_RECORD.pack(bytes.fromhex(urlhash), digest, fetched_at, interval, fetches, changes))
+            return changed
+
+    def queue(self, urlhash):
+        with self.lock:
+            self.queued.add(urlhash)
+
+    def dequeue(self, urlhash):
+        ''' Whether urlhash was queued for a revisit; it is forgotten either way. '''
+        with self.lock:
+            if urlhash not in self.queued:
+                return False
+            self.queued.remove(urlhash)
+            return True
+
+    def due(self, now=None):
+        ''' urlhashes whose next visit is at or before now, in one sequential read. '''
+        now = now if now is not None else time.time()
+        with self.lock:
+            latest = self.log.latest()
+        for record in latest:
+            revisit = self._unpack(record)
+            if revisit.fetched_at + revisit.interval <= now:
+                yield revisit.urlhash
+
+    def change_rate(self, urlhash):
+        ''' Share of revisits that found the page changed, or None before any revisit. '''
+        revisit = self.get(urlhash)
+        if revisit is None or revisit.fetches < 2:
+            return None
+        return revisit.changes / (revisit.fetches - 1)
+
+    def close(self):
+        with self.lock:
+            self.log.close()
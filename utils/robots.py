@@ -0,0 +1,103 @@
+import time
+import shelve
+import urllib.error
+import urllib.request
+import urllib.robotparser
+
+from collections import OrderedDict
+from urllib.parse import urlparse
+from http.client import HTTPException
+from threading import RLock, Event
+
+from utils import get_logger
+
+
+class RobotsCache(object):
+    ''' Parsed robots.txt rules shared by every worker.
+
+    Lookups hit an in-memory LRU first, then the persistent store, and only
+    then fetch robots.txt. Entries expire after ttl seconds; hosts whose
+    robots.txt could not be fetched are remembered as None (disallowed) for
+    negative_ttl seconds. Concurrent misses for one host wait on a single
+    fetch instead of each downloading the file. '''
+
+    def __init__(self, save_file, capacity=1024, ttl=86400, negative_ttl=3600, timeout=10, fetch=None):
+        self.logger = get_logger("ROBOTS")
+        self.capacity = capacity
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.fetch = fetch if fetch else self.fetch_lines
+        self.lock = RLock()
+        self.parsers = OrderedDict() # host -> (expires at, RobotFileParser or None)
+        self.in_flight = dict() # host -> Event set once its fetch finishes
+        self.save = shelve.open(save_file) # host -> (fetched at, robots.txt lines or None)
+
+    def can_fetch(self, url, parsed=None):
+        parsed = parsed if parsed else urlparse(url)
+        robot_parser = self.get(parsed.scheme, parsed.hostname)
+        return robot_parser is not None and robot_parser.can_fetch("*", url)
+
+    def get(self, scheme, host):
+        while True:
+            with self.lock:
+                now = time.time()
+                entry = self.parsers.get(host)
+                if entry and entry[0] > now:
+                    self.parsers.move_to_end(host)
+                    return entry[1]
+                stored = self.save.get(host)
+                # Skip anything not written by this class (e.g. pickled parsers from older runs).
+                if isinstance(stored, tuple) and stored[0] + self._ttl(stored[1]) > now:
+                    return self._remember(host, stored[0], stored[1])
+                waiting = self.in_flight.get(host)
+                if waiting is None:
+                    self.in_flight[host] = Event()
+                    break
+            # Another worker is already fetching this host, reuse its result.
+            waiting.wait()
+
+        try:
+            fetched_at, lines = time.time(), self.fetch(scheme, host)
+            with self.lock:
+                self.save[host] = (fetched_at, lines)
+                self.save.sync()
+                return self._remember(host, fetched_at, lines)
+        finally:
+            with self.lock:
+                self.in_flight.pop(host).set()
+
+    def _ttl(self, lines):
+        return self.ttl if lines is not None else self.negative_ttl
+
+    def _remember(self, host, fetched_at, lines):
+        robot_parser = None
+        if lines is not None:
+            robot_parser = urllib.robotparser.RobotFileParser()
+            robot_parser.parse(lines)
+        self.parsers[host] = (fetched_at + self._ttl(lines), robot_parser)
+        self.parsers.move_to_end(host)
+        while len(self.parsers) > self.capacity:
+            self.parsers.popitem(last=False)
+        return robot_parser
+
+    def fetch_lines(self, scheme, host):
+        ''' Downloads robots.txt with the same rules as RobotFileParser.read,
+        returning its lines, or None if the host could not be reached. '''
+        url = f"{scheme}://{host}/robots.txt"
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as resp:
+                return resp.read().decode("utf-8", errors="replace").splitlines()
+        except urllib.error.HTTPError as err:
+            if err.code in (401, 403):
+                return ["User-agent: *", "Disallow: /"]
+            if 400 <= err.code < 500:
+                return []
+            self.logger.info(f"HTTP {err.code} when fetching {url}")
+        except (urllib.error.URLError, HTTPException, OSError, ValueError) as err:
+            self.logger.info(f"{type(err).__name__} when fetching {url}: {err}")
+        return None
+
+    def close(self):
+        with self.lock:
+            self.save.close()
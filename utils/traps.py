@@ -0,0 +1,135 @@
+import re
+
+from collections import deque
+from threading import RLock
+from urllib.parse import urlsplit, parse_qsl
+
+from utils import get_logger, get_urlhash
+
+# Path segments are reduced to their shape, so /calendar/2019-03-01 and
+# /calendar/2019-03-02 share the template /calendar/<n>-<n>-<n>.
+NUMBER = re.compile(r"\d+")
+IDENTIFIER = re.compile(r"^(?=.*\d)[0-9a-fA-F-]{16,}$")
+
+
+def url_template(url):
+    ''' The path shape of url plus the sorted set of its query keys, e.g.
+    https://h.ics.uci.edu/wiki/Page?action=edit&oldid=12 -> /wiki/Page?action&oldid. '''
+    parsed = urlsplit(url)
+    segments = list()
+    for segment in parsed.path.split("/"):
+        if IDENTIFIER.match(segment):
+            segments.append("<id>")
+        elif len(segment) > 64:
+            segments.append("<long>")
+        else:
+            segments.append(NUMBER.sub("<n>", segment))
+    keys = sorted({key for key, _ in parse_qsl(parsed.query, keep_blank_values=True)})
+    return "/".join(segments) + ("?" + "&".join(keys) if keys else "")
+
+
+class TemplateStats(object):
+    __slots__ = ("outcomes", "state", "admitted", "refused")
+
+    def __init__(self, window):
+        self.outcomes = deque(maxlen=window) # True for each recent fetch that stored a page
+        self.state = "open"
+        self.admitted = 0
+        self.refused = 0
+
+
+class TrapDetector(object):
+    ''' Rolling per-host statistics by url template, used to hold back urls
+    of templates that stopped yielding pages (calendars, faceted search,
+    ?share=/?action= variants, endless pagination).
+
+    record(url, useful) notes whether a fetched url was stored or turned out
+    a duplicate, error or empty page. Once a template has min_samples
+    outcomes in its last `window`, a yield (stored / fetched) below
+    throttle_yield throttles it: only one in throttle_every of its new urls
+    is admitted, so it can still recover. A full window at or below
+    stop_yield stops it: admit() refuses all its new urls and stopped() lets
+    the frontier drop the ones already queued. Every state change is logged.
+    A host keeps at most max_templates templates; urls of further templates
+    share one overflow template. '''
+
+    def __init__(self, window=50, min_samples=20, throttle_yield=0.2, throttle_every=10,
+                 stop_yield=0.05, max_templates=1000):
+        self.logger = get_logger("TRAPS")
+        self.window = window
+        self.min_samples = min_samples
+        self.throttle_yield = throttle_yield
+        self.throttle_every = throttle_every
+        self.stop_yield = stop_yield
+        self.max_templates = max_templates
+        self.lock = RLock()
+        self.hosts = dict() # host -> {template: TemplateStats}
+
+    def _stats(self, url, create=False):
+        host = urlsplit(url).hostname
+        template = url_template(url)
+        templates = self.hosts.get(host)
+        if templates is None:
+            if not create:
+                return host, template, None
+            templates = self.hosts[host] = dict()
+        stats = templates.get(template)
+        if stats is None and len(templates) >= self.max_templates:
+            # Looked up the same way whether or not it may be created, so
+            # stopped() sees the overflow template admit() counted it against.
+            template = "<overflow>"
+            stats = templates.get(template)
+        if stats is None and create:
+            stats = templates[template] = TemplateStats(self.window)
+        return host, template, stats
+
+    def record(self, url, useful):
+        with self.lock:
+            host, template, stats = self._stats(url, create=True)
+            stats.outcomes.append(bool(useful))
+            if stats.state == "stopped" or len(stats.outcomes) < self.min_samples:
+                return
+            fetched = len(stats.outcomes)
+            rate = sum(stats.outcomes) / fetched
+            if fetched == self.window and rate <= self.stop_yield:
+                state = "stopped"
+            elif rate < self.throttle_yield:
+                state = "throttled"
+            else:
+                state = "open"
+            if state != stats.state:
+                self.logger.info(
+                    f"{host} {template}: {stats.state} -> {state}, {sum(stats.outcomes)} of the "
+                    f"last {fetched} fetches stored ({stats.admitted} urls admitted, {stats.refused} refused).")
+                stats.state = state
+
+    def admit(self, url):
+        ''' None if url may be queued, else why not ("throttled" or "stopped"). '''
+        with self.lock:
+            _, _, stats = self._stats(url, create=True)
+            reason = None
+            if stats.state == "stopped":
+                reason = "stopped"
+            elif stats.state == "throttled":
+                # Decided by the urlhash, so offering the same url again gives the same answer.
+                if int(get_urlhash(url)[:8], 16) % self.throttle_every:
+                    reason = "throttled"
+            if reason:
+                stats.refused += 1
+            else:
+                stats.admitted += 1
+            return reason
+
+    def stopped(self, url):
+        with self.lock:
+            _, _, stats = self._stats(url)
+            return stats is not None and stats.state == "stopped"
+
+    def summary(self):
+        # Template counts by state, for the metrics snapshot.
+        counts = {"open": 0, "throttled": 0, "stopped": 0}
+        with self.lock:
+            for templates in self.hosts.values():
+                for stats in templates.values():
+                    counts[stats.state] += 1
+        return counts